@@ -0,0 +1,87 @@
+"""
+Compares the object graph heap with the arena heap. Reports the memory used by
+each cell and the allocation throughput.
+
+Run with `python -m benchmarks.arena`.
+"""
+import time
+import tracemalloc
+
+from treadmill import Heap, ArenaHeap
+
+HEAP_SIZES = (10000, 100000, 1000000)
+
+
+def no_roots():
+    return ()
+
+
+def no_children(cell):
+    return ()
+
+
+def memory_per_cell(heap_class, size):
+    """
+    Returns the number of bytes used by each cell of a heap with the specified
+    number of cells.
+    """
+    tracemalloc.start()
+    heap = heap_class(no_roots, no_children, initial_size=size)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del heap
+
+    return used / size
+
+
+def allocation_throughput(heap_class, size):
+    """
+    Returns the number of allocations per second, when allocating all cells of
+    a heap with the specified number of cells.
+    """
+    heap = heap_class(no_roots, no_children, initial_size=size, scan_threshold=0)
+
+    start = time.perf_counter()
+
+    for _ in range(size - 1):
+        heap.allocate()
+
+    return (size - 1) / (time.perf_counter() - start)
+
+
+def scanning_throughput(heap_class, size):
+    """
+    Returns the number of allocations per second, when allocating cells while
+    keeping the last 100 allocated cells live.
+    """
+    live = []
+    heap = heap_class(lambda: live, no_children)
+
+    start = time.perf_counter()
+
+    for _ in range(size):
+        live.append(heap.allocate())
+
+        if len(live) > 100:
+            live.pop(0)
+
+    return size / (time.perf_counter() - start)
+
+
+def main():
+    print('{:>10} {:>10} {:>14} {:>18} {:>18}'.format(
+        'heap', 'cells', 'bytes/cell', 'allocations/s', 'scanning allocs/s'))
+
+    for size in HEAP_SIZES:
+        for heap_class in (Heap, ArenaHeap):
+            print('{:>10} {:>10} {:>14.1f} {:>18.0f} {:>18.0f}'.format(
+                heap_class.__name__,
+                size,
+                memory_per_cell(heap_class, size),
+                allocation_throughput(heap_class, size),
+                scanning_throughput(heap_class, size)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Compares the read barrier with the write barrier. A read-heavy workload does
+50 reads per allocation, a write-heavy workload does 10 writes per allocation
+and no reads. Reports the heap operations per second and the barrier hits.
+
+Run with `python -m benchmarks.barriers`.
+"""
+import gc
+import random
+import time
+
+from treadmill import Heap, ArenaHeap
+
+NUM_ALLOCATIONS = 20000
+NUM_LIVE = 1000
+
+
+def get_value(heap, cell):
+    # reads the cell without a barrier, like the collector does
+    if isinstance(heap, ArenaHeap):
+        return heap.arena.values[cell]
+    else:
+        return cell.value
+
+
+def run(heap_class, barrier, reads, writes):
+    """
+    Allocates cells that point to one other live cell, and does the number of
+    reads and writes on random live cells after each allocation. Returns the
+    operations per second and the heap metrics.
+    """
+    live = []
+
+    def get_children(cell):
+        child = get_value(heap, cell)
+        return (child,) if child is not None else ()
+
+    heap = heap_class(get_roots=lambda: live, get_children=get_children, barrier=barrier)
+    rng = random.Random(0)
+
+    # precompute the random choices so that they are not measured
+    picks = [rng.randrange(NUM_LIVE) for _ in range(4096)]
+    read = heap.read
+    write = heap.write
+
+    start = time.perf_counter()
+
+    for i in range(NUM_ALLOCATIONS):
+        cell = heap.allocate()
+
+        if len(live) < NUM_LIVE:
+            live.append(cell)
+            continue
+
+        live[picks[i % 4096]] = cell
+
+        for j in range(reads):
+            read(live[picks[(i + j) % 4096]])
+
+        for j in range(writes):
+            write(live[picks[(i + j) % 4096]], live[picks[(i + j + 1) % 4096]])
+
+    elapsed = time.perf_counter() - start
+    num_operations = NUM_ALLOCATIONS * (1 + reads + writes)
+
+    return num_operations / elapsed, heap.metrics()
+
+
+def main():
+    workloads = (
+        ('read-heavy', 50, 0),
+        ('write-heavy', 0, 10),
+    )
+
+    print('{:>10} {:>12} {:>8} {:>12} {:>10} {:>10}'.format(
+        'heap', 'workload', 'barrier', 'ops/s', 'read hits', 'write hits'))
+
+    for heap_class in (Heap, ArenaHeap):
+        for name, reads, writes in workloads:
+            for barrier in ('read', 'write'):
+                gc.disable()
+                ops, metrics = run(heap_class, barrier, reads, writes)
+                gc.enable()
+
+                print('{:>10} {:>12} {:>8} {:>12.0f} {:>10} {:>10}'.format(
+                    heap_class.__name__, name, barrier, ops,
+                    metrics['read_barrier_hits'], metrics['write_barrier_hits']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Compares a heap that scans inline, shared by several mutator threads through
+one lock, with a ThreadSafeHeap, which allocates from per-thread buffers, and
+a ConcurrentHeap, whose collector thread does the scanning.
+Reports the allocation throughput, the p50, p99 and maximum allocation pause,
+and the final heap size. The mutators either allocate all the time, or wait
+for a millisecond every 100 allocations, like request threads waiting for
+I/O, which gives the collector thread time to run.
+
+Run with `python -m benchmarks.concurrent`.
+"""
+import threading
+import time
+
+from episcopal.runtime import Indirection
+from treadmill import Heap
+from treadmill.concurrent import ThreadSafeHeap, ConcurrentHeap
+
+NUM_ALLOCATIONS = 20000
+NUM_LIVE = 200
+THREAD_COUNTS = (1, 2, 4)
+WAIT_EVERY = 100
+
+
+class LockedHeap(Heap):
+    """
+    The inline heap behind one global lock, which is how it is shared between
+    threads without the concurrent mode.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    def allocate(self):
+        with self.lock:
+            return super().allocate()
+
+    def read(self, cell):
+        with self.lock:
+            return super().read(cell)
+
+
+def stop(heap):
+    if isinstance(heap, ConcurrentHeap):
+        heap.stop()
+
+
+def mutate(heap, live, pauses, wait):
+    clock = time.perf_counter
+
+    for i in range(NUM_ALLOCATIONS):
+        start = clock()
+        cell = heap.allocate()
+        pauses.append(clock() - start)
+
+        # every other cell points to the previous one
+        if i % 2 and live:
+            heap.write(cell, Indirection(live[-1]))
+        else:
+            heap.write(cell, Indirection(None))
+
+        live.append(cell)
+
+        if len(live) > NUM_LIVE:
+            live.pop(0)
+
+        if wait and i % WAIT_EVERY == 0:
+            time.sleep(0.001)
+
+
+def run(heap_class, num_threads, wait):
+    lives = [[] for _ in range(num_threads)]
+    pauses = [[] for _ in range(num_threads)]
+
+    def get_roots():
+        return [cell for live in lives for cell in live]
+
+    def get_children(cell):
+        value = heap.read(cell)
+        return value.children() if value is not None else ()
+
+    heap = heap_class(get_roots, get_children)
+
+    threads = [threading.Thread(target=mutate, args=(heap, lives[i], pauses[i], wait))
+               for i in range(num_threads)]
+
+    start = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    seconds = time.perf_counter() - start
+    stop(heap)
+
+    return seconds, sorted(pause for thread_pauses in pauses for pause in thread_pauses), heap.num_total
+
+
+def percentile(pauses, p):
+    return pauses[min(len(pauses) - 1, int(len(pauses) * p))]
+
+
+def main():
+    print('{:>16} {:>6} {:>8} {:>12} {:>10} {:>10} {:>10} {:>8}'.format(
+        'heap', 'wait', 'threads', 'allocs/s', 'p50 us', 'p99 us', 'max us', 'cells'))
+
+    for wait in (False, True):
+        for num_threads in THREAD_COUNTS:
+            for heap_class in (LockedHeap, ThreadSafeHeap, ConcurrentHeap):
+                seconds, pauses, num_total = run(heap_class, num_threads, wait)
+
+                print('{:>16} {:>6} {:>8} {:>12.0f} {:>10.1f} {:>10.1f} {:>10.1f} {:>8}'.format(
+                    heap_class.__name__, 'yes' if wait else 'no', num_threads,
+                    len(pauses) / seconds,
+                    percentile(pauses, 0.5) * 1e6, percentile(pauses, 0.99) * 1e6,
+                    pauses[-1] * 1e6, num_total))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Measures the time it takes a heap to grow to N cells: by allocating with the
+fixed expansion size, by allocating with geometric expansion, by passing N as
+the initial size and by reserving N cells.
+
+Run with `python -m benchmarks.expansion`.
+"""
+import time
+
+from treadmill import Heap, ArenaHeap
+
+HEAP_SIZES = (100000, 1000000)
+
+
+def create_heap(heap_class, **kwargs):
+    return heap_class(lambda: (), lambda cell: (), scan_threshold=0, **kwargs)
+
+
+def allocate_all(heap_class, size, **kwargs):
+    heap = create_heap(heap_class, **kwargs)
+
+    for _ in range(size):
+        heap.allocate()
+
+
+def reserve(heap_class, size):
+    heap = create_heap(heap_class)
+    heap.reserve(size)
+
+
+def main():
+    strategies = (
+        ('fixed', lambda heap_class, size: allocate_all(heap_class, size)),
+        ('geometric', lambda heap_class, size: allocate_all(heap_class, size, growth_factor=1.5,
+                                                            max_expand_size=65536)),
+        ('initial size', lambda heap_class, size: create_heap(heap_class, initial_size=size)),
+        ('reserve', reserve),
+    )
+
+    print('{:>10} {:>10} {:>14} {:>10}'.format('heap', 'cells', 'strategy', 'seconds'))
+
+    for size in HEAP_SIZES:
+        for heap_class in (Heap, ArenaHeap):
+            for name, run in strategies:
+                start = time.perf_counter()
+                run(heap_class, size)
+
+                print('{:>10} {:>10} {:>14} {:>10.3f}'.format(
+                    heap_class.__name__, size, name, time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
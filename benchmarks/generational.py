@@ -0,0 +1,127 @@
+"""
+Compares the single treadmill with the generational heap on workloads where
+most cells are long-lived. Reports the scan steps per allocation, of minor
+and major cycles together, the peak heap size and the run time.
+
+Run with `python -m benchmarks.generational`.
+"""
+import random
+import time
+from collections import Counter
+
+from episcopal.garbage import get_children
+from episcopal.runtime import Integer, Indirection
+from treadmill import Heap
+from treadmill.generational import GenerationalHeap
+from treadmill.trace import Tracer
+
+NUM_ALLOCATIONS = 50000
+# also the nursery size of the generational heap
+INITIAL_SIZE = 1000
+
+
+class CountingTracer(Tracer):
+    def __init__(self):
+        self.counts = Counter()
+
+    def event(self, kind, heap, cell=None):
+        self.counts[kind] += 1
+
+
+class Workload:
+    def __init__(self, heap_class):
+        self.roots = []
+        self.tracer = CountingTracer()
+        self.heap = heap_class(lambda: self.roots, self.get_children, initial_size=INITIAL_SIZE,
+                               tracer=self.tracer)
+        self.peak = 0
+
+    def get_children(self, cell):
+        value = self.heap.read(cell)
+        return get_children(value) if value is not None else ()
+
+    def allocate(self, value):
+        cell = self.heap.allocate()
+        self.heap.write(cell, value)
+        self.peak = max(self.peak, self.heap.num_total + getattr(self.heap, 'old', self.heap).num_total)
+        return cell
+
+
+def allocate_constants(workload, num_constants):
+    ints = []
+
+    for i in range(num_constants):
+        ints.append(workload.allocate(Integer(i)))
+        workload.roots.append(ints[-1])
+
+    return ints
+
+
+def constants(workload, num_constants):
+    """
+    Allocates long-lived integers and keeps rebuilding short indirection
+    chains, which point to the integers.
+    """
+    rng = random.Random(0)
+    ints = allocate_constants(workload, num_constants)
+    head = None
+
+    for i in range(NUM_ALLOCATIONS):
+        if i % 20 == 0:
+            head = workload.allocate(Indirection(rng.choice(ints)))
+        else:
+            head = workload.allocate(Indirection(head))
+
+        if i == 0:
+            workload.roots.append(head)
+        else:
+            workload.roots[-1] = head
+
+
+def registers(workload, num_constants):
+    """
+    Like constants, but the chains are stored in long-lived indirections,
+    so old cells point to young ones.
+    """
+    rng = random.Random(0)
+    ints = allocate_constants(workload, num_constants)
+    slots = []
+
+    for _ in range(100):
+        slots.append(workload.allocate(Indirection(None)))
+        workload.roots.append(slots[-1])
+
+    for i in range(NUM_ALLOCATIONS):
+        if i % 20 == 0:
+            head = workload.allocate(Indirection(rng.choice(ints)))
+            workload.roots.append(head)
+        else:
+            head = workload.allocate(Indirection(head))
+            workload.roots[-1] = head
+
+        if i % 20 == 19:
+            workload.heap.write(rng.choice(slots), Indirection(head))
+            workload.roots.pop()
+
+
+def main():
+    print('{:>10} {:>10} {:>18} {:>12} {:>10} {:>10}'.format(
+        'workload', 'constants', 'heap', 'steps/alloc', 'peak', 'seconds'))
+
+    for run in (constants, registers):
+        for num_constants in (1000, 10000):
+            for heap_class in (Heap, GenerationalHeap):
+                start = time.perf_counter()
+                workload = Workload(heap_class)
+                run(workload, num_constants)
+                seconds = time.perf_counter() - start
+
+                counts = workload.tracer.counts
+
+                print('{:>10} {:>10} {:>18} {:>12.2f} {:>10} {:>10.2f}'.format(
+                    run.__name__, num_constants, heap_class.__name__,
+                    counts['scan'] / counts['allocate'], workload.peak, seconds))
+
+
+if __name__ == '__main__':
+    main()
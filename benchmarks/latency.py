@@ -0,0 +1,89 @@
+"""
+Measures allocation pauses of a heap that holds objects with a large number
+of children, like a Distribution with many elements. Compares scanning a
+fixed number of cells per allocation with the work and time budgets, and
+reports the p50, p99 and maximum pause.
+
+Run with `python -m benchmarks.latency`.
+"""
+import gc
+import time
+
+from treadmill import Heap, ArenaHeap
+
+NUM_ALLOCATIONS = 200000
+FAN_OUT = 20000
+NUM_LARGE_OBJECTS = 4
+
+
+def get_value(heap, cell):
+    # reads the cell without the read barrier, like the collector does
+    if isinstance(heap, ArenaHeap):
+        return heap.arena.values[cell]
+    else:
+        return cell.value
+
+
+def run(heap_class, **kwargs):
+    large_objects = []
+
+    def get_roots():
+        return large_objects
+
+    def get_children(cell):
+        return get_value(heap, cell) or ()
+
+    heap = heap_class(get_roots=get_roots, get_children=get_children, **kwargs)
+
+    clock = time.perf_counter
+    pauses = []
+    elements = None
+
+    for i in range(NUM_ALLOCATIONS):
+        start = clock()
+        cell = heap.allocate()
+        pauses.append(clock() - start)
+
+        if i % FAN_OUT == 0:
+            # start a new large object, the following cells are its elements
+            elements = []
+            heap.write(cell, elements)
+            large_objects.append(cell)
+
+            if len(large_objects) > NUM_LARGE_OBJECTS:
+                large_objects.pop(0)
+        else:
+            heap.write(cell, None)
+            elements.append(cell)
+
+    return sorted(pauses), heap.num_total
+
+
+def percentile(pauses, p):
+    return pauses[min(len(pauses) - 1, int(len(pauses) * p))]
+
+
+def main():
+    modes = (
+        ('5 cells', {'scan_step_size': 5}),
+        ('16 units', {'scan_budget': 16}),
+        ('10 us', {'scan_time_budget': 10}),
+    )
+
+    print('{:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'heap', 'scan', 'p50 us', 'p99 us', 'max us', 'cells'))
+
+    for heap_class in (Heap, ArenaHeap):
+        for name, kwargs in modes:
+            # keep Python's cyclic collector from adding its own pauses
+            gc.disable()
+            pauses, num_total = run(heap_class, **kwargs)
+            gc.enable()
+
+            print('{:>10} {:>10} {:>10.1f} {:>10.1f} {:>10.1f} {:>10}'.format(
+                heap_class.__name__, name, percentile(pauses, 0.5) * 1e6,
+                percentile(pauses, 0.99) * 1e6, pauses[-1] * 1e6, num_total))
+
+
+if __name__ == '__main__':
+    main()
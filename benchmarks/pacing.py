@@ -0,0 +1,95 @@
+"""
+Compares the fixed scan_step_size and scan_threshold with the pacer. Reports
+the peak heap size and the total scan work on the workloads of stress_test.py
+and linked_list.py, and on a workload whose live set grows and shrinks.
+
+Run with `python -m benchmarks.pacing`.
+"""
+from collections import Counter
+
+from episcopal.garbage import get_children
+from episcopal.runtime import Integer, Indirection
+from treadmill import Heap, Pacer
+from treadmill.trace import Tracer
+
+
+class CountingTracer(Tracer):
+    def __init__(self):
+        self.counts = Counter()
+
+    def event(self, kind, heap, cell=None):
+        self.counts[kind] += 1
+
+
+class Workload:
+    def __init__(self, pacer):
+        self.roots = []
+        self.tracer = CountingTracer()
+        self.heap = Heap(lambda: self.roots, self.get_children, tracer=self.tracer, pacer=pacer)
+        self.peak = 0
+
+    def get_children(self, cell):
+        return get_children(self.heap.read(cell))
+
+    def allocate(self, value):
+        cell = self.heap.allocate()
+        self.heap.write(cell, value)
+        self.peak = max(self.peak, self.heap.num_total)
+        return cell
+
+
+def stress(workload):
+    """
+    Keeps the last 100 allocated integers live, like stress_test.py.
+    """
+    for _ in range(20000):
+        workload.roots.append(workload.allocate(Integer(123)))
+
+        if len(workload.roots) > 100:
+            workload.roots.pop(0)
+
+
+def linked_list(workload):
+    """
+    Builds a linked list of 100 indirections again and again, like
+    linked_list.py.
+    """
+    for _ in range(200):
+        head = workload.allocate(Indirection(None))
+        workload.roots[:] = [head]
+
+        for _ in range(99):
+            head = workload.allocate(Indirection(head))
+            workload.roots[0] = head
+
+
+def growing(workload):
+    """
+    Grows the live set to 2000 integers and shrinks it back to 100, twice.
+    """
+    for _ in range(2):
+        for size in list(range(100, 2000)) + list(range(2000, 100, -1)):
+            workload.roots.append(workload.allocate(Integer(123)))
+
+            while len(workload.roots) > size:
+                workload.roots.pop(0)
+
+
+def main():
+    print('{:>12} {:>8} {:>10} {:>12} {:>14}'.format(
+        'workload', 'pacing', 'peak size', 'scan steps', 'steps/alloc'))
+
+    for run in (stress, linked_list, growing):
+        for name, pacer in (('fixed', None), ('pacer', Pacer())):
+            workload = Workload(pacer)
+            run(workload)
+
+            counts = workload.tracer.counts
+
+            print('{:>12} {:>8} {:>10} {:>12} {:>14.2f}'.format(
+                run.__name__, name, workload.peak, counts['scan'],
+                counts['scan'] / counts['allocate']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Compares the slot-based Episcopal runtime objects with objects that keep
+their fields in a __dict__ and build a list of children on every call, like
+they used to. Reports the bytes used by each object and the cells scanned
+per second by a full scanning cycle.
+
+Run with `python -m benchmarks.runtime`.
+"""
+import gc
+import time
+import tracemalloc
+
+from episcopal import runtime
+from episcopal.garbage import get_children
+from treadmill import Heap
+
+NUM_OBJECTS = 100000
+NUM_ELEMENTS = 10
+
+
+class DictInteger:
+    def __init__(self, value):
+        self.value = value
+
+    def children(self):
+        return ()
+
+
+class DictDistribution:
+    def __init__(self, type, n, elements):
+        self.type = type
+        self.n = n
+        self.elements = elements
+
+    def children(self):
+        return [self.type, self.n] + self.elements
+
+
+def get_dict_children(obj):
+    return obj.children() if obj is not None else ()
+
+
+LAYOUTS = (
+    ('dict', DictInteger, DictDistribution, get_dict_children),
+    ('slots', runtime.Integer, runtime.Distribution, get_children),
+)
+
+
+def memory_per_object(factory):
+    """
+    Returns the number of bytes used by each of the objects created by the
+    factory.
+    """
+    tracemalloc.start()
+    objects = [factory() for _ in range(NUM_OBJECTS)]
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # the list holding the objects is not part of them
+    return (used - objects.__sizeof__()) / NUM_OBJECTS
+
+
+def scanning_throughput(integer, distribution, children):
+    """
+    Fills a heap with distributions of integers, all reachable, and returns
+    the number of cells scanned per second by one cycle.
+    """
+    roots = []
+    heap = Heap(lambda: roots, lambda cell: children(cell.value),
+                initial_size=NUM_OBJECTS + 1, scan_threshold=0)
+
+    for _ in range(NUM_OBJECTS // (NUM_ELEMENTS + 3)):
+        cells = heap.allocate_many(NUM_ELEMENTS + 3)
+
+        for cell in cells[1:]:
+            heap.write(cell, integer(1))
+
+        heap.write(cells[0], distribution(cells[1], cells[2], cells[3:]))
+        roots.append(cells[0])
+
+    num_cells = len(roots) * (NUM_ELEMENTS + 3)
+    heap.start_scanning()
+    start = time.perf_counter()
+
+    # all cells are live, so the cycle restarts instead of finishing
+    for _ in range(num_cells):
+        heap.scan_step()
+
+    return num_cells / (time.perf_counter() - start)
+
+
+def main():
+    print('{:>8} {:>14} {:>19} {:>16}'.format(
+        'layout', 'integer bytes', 'distribution bytes', 'scanned cells/s'))
+
+    for name, integer, distribution, children in LAYOUTS:
+        gc.disable()
+        integer_bytes = memory_per_object(lambda: integer(1))
+        distribution_bytes = memory_per_object(lambda: distribution(None, None, [None] * NUM_ELEMENTS))
+        throughput = scanning_throughput(integer, distribution, children)
+        gc.enable()
+
+        print('{:>8} {:>14.1f} {:>19.1f} {:>16.0f}'.format(
+            name, integer_bytes, distribution_bytes, throughput))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares boxed Episcopal integers with unboxed scalar cells. Reports the
+bytes used by each live integer cell and the allocations per second of the
+workload of stress_test.py, which allocates nothing but integers.
+
+Run with `python -m benchmarks.scalars`.
+"""
+import gc
+import time
+import tracemalloc
+
+from episcopal.garbage import get_children
+from episcopal.runtime import Integer
+from treadmill import Heap, ArenaHeap
+
+NUM_CELLS = 100000
+NUM_ALLOCATIONS = 200000
+
+
+def write_boxed(heap, cell, value):
+    heap.write(cell, Integer(value))
+
+
+def write_unboxed(heap, cell, value):
+    heap.write_scalar(cell, Integer, value)
+
+
+def memory_per_cell(heap_class, write):
+    """
+    Returns the number of bytes used by each cell of a heap whose cells all
+    hold a live integer.
+    """
+    roots = []
+
+    tracemalloc.start()
+    heap = heap_class(lambda: roots, lambda cell: (), initial_size=NUM_CELLS + 1)
+
+    for i in range(NUM_CELLS):
+        # large enough values not to be cached by Python
+        write(heap, heap.allocate(), 1000 + i)
+
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return used / NUM_CELLS
+
+
+def allocation_throughput(heap_class, write):
+    """
+    Returns the number of allocations per second, when keeping the last 100
+    allocated integers live, like stress_test.py.
+    """
+    live = []
+
+    def get_heap_children(cell):
+        return get_children(heap.read(cell))
+
+    heap = heap_class(lambda: live, get_heap_children)
+
+    start = time.perf_counter()
+
+    for i in range(NUM_ALLOCATIONS):
+        cell = heap.allocate()
+        write(heap, cell, i)
+        live.append(cell)
+
+        if len(live) > 100:
+            live.pop(0)
+
+    return NUM_ALLOCATIONS / (time.perf_counter() - start)
+
+
+def main():
+    print('{:>10} {:>10} {:>12} {:>16}'.format('heap', 'integers', 'bytes/cell', 'allocations/s'))
+
+    for heap_class in (Heap, ArenaHeap):
+        for name, write in (('boxed', write_boxed), ('unboxed', write_unboxed)):
+            gc.disable()
+            memory = memory_per_cell(heap_class, write)
+            throughput = allocation_throughput(heap_class, write)
+            gc.enable()
+
+            print('{:>10} {:>10} {:>12.1f} {:>16.0f}'.format(
+                heap_class.__name__, name, memory, throughput))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Compares building an object graph of Episcopal distributions with
+allocate and write, to restoring it from a snapshot file. Reports the time of
+both and the size of the snapshot.
+
+Run with `python -m benchmarks.snapshot`.
+"""
+import os
+import tempfile
+import time
+
+from episcopal.garbage import get_children
+from episcopal.runtime import Distribution, Integer
+from treadmill import Heap, ArenaHeap, snapshot
+
+NUM_CELLS = (10000, 100000)
+NUM_ELEMENTS = 10
+
+
+def build(heap_class, num_cells):
+    """
+    Builds distributions of integers until the heap holds the number of cells.
+    Returns the heap and the distributions, which are the roots.
+    """
+    roots = []
+
+    def get_heap_children(cell):
+        return get_children(heap.read(cell))
+
+    heap = heap_class(lambda: roots, get_heap_children)
+
+    for _ in range(num_cells // (NUM_ELEMENTS + 3)):
+        cells = [heap.allocate() for _ in range(NUM_ELEMENTS + 3)]
+
+        for i, cell in enumerate(cells[1:]):
+            heap.write(cell, Integer(i))
+
+        heap.write(cells[0], Distribution(cells[1], cells[2], cells[3:]))
+        roots.append(cells[0])
+
+    return heap, roots
+
+
+def restore(path):
+    roots = []
+
+    def get_heap_children(cell):
+        return get_children(heap.read(cell))
+
+    heap, saved_roots = snapshot.load_file(path, lambda: roots, get_heap_children)
+    roots.extend(saved_roots)
+
+    return heap
+
+
+def main():
+    print('{:>10} {:>10} {:>10} {:>12} {:>12}'.format(
+        'heap', 'cells', 'build s', 'restore s', 'snapshot kB'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'heap.snapshot')
+
+        for num_cells in NUM_CELLS:
+            for heap_class in (Heap, ArenaHeap):
+                start = time.perf_counter()
+                heap, roots = build(heap_class, num_cells)
+                build_time = time.perf_counter() - start
+
+                with open(path, 'wb') as file:
+                    snapshot.save(heap, file, extra=roots)
+
+                start = time.perf_counter()
+                restore(path)
+                restore_time = time.perf_counter() - start
+
+                print('{:>10} {:>10} {:>10.3f} {:>12.3f} {:>12.0f}'.format(
+                    heap_class.__name__, num_cells, build_time, restore_time,
+                    os.path.getsize(path) / 1024))
+
+
+if __name__ == '__main__':
+    main()
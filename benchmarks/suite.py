@@ -0,0 +1,295 @@
+"""
+Runs the standard benchmark cases on Heap and ArenaHeap, and reports the
+allocation throughput, the memory per cell, the allocation pause percentiles,
+also of the scan work, expansions and flips done by allocations, and the
+cells scanned per allocation. The results can be saved as JSON and
+compared with the results of another revision.
+
+Run with `python -m benchmarks.suite`, see `--help` for the options. For
+example, to check a change for regressions:
+
+    git stash
+    python -m benchmarks.suite --output before.json
+    git stash pop
+    python -m benchmarks.suite --compare before.json
+"""
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from episcopal.garbage import get_children
+from episcopal.runtime import Integer, Indirection
+from treadmill import Heap, ArenaHeap, HeapStats
+
+HEAP_CLASSES = (Heap, ArenaHeap)
+
+# metrics for which a higher value is better, lower is better for the rest
+HIGHER_IS_BETTER = {'allocations_per_second'}
+
+
+class Workload:
+    """
+    A heap whose cells hold Episcopal runtime objects, and the roots of the
+    program using it.
+    """
+
+    def __init__(self, heap_class, **kwargs):
+        self.roots = []
+        self.heap = heap_class(lambda: self.roots, self.get_children, **kwargs)
+
+    def get_children(self, cell):
+        return get_children(self.heap.read(cell))
+
+    def allocate(self, value):
+        cell = self.heap.allocate()
+        self.heap.write(cell, value)
+        return cell
+
+
+def empty(workload, size):
+    """
+    Allocates cells that are never live.
+    """
+    for _ in range(size):
+        workload.heap.allocate()
+
+    return size
+
+
+def growing(workload, size):
+    """
+    Allocates integers and keeps every tenth one live, so the live set grows
+    for the whole run, like stress_test.py with an unbounded window.
+    """
+    for i in range(size):
+        cell = workload.allocate(Integer(i))
+
+        if i % 10 == 0:
+            workload.roots.append(cell)
+
+    return size
+
+
+def linked_list(workload, size):
+    """
+    Builds linked lists of 100 indirections again and again, only the list
+    being built is live, like linked_list.py.
+    """
+    for _ in range(size // 100):
+        head = workload.allocate(Indirection(None))
+        workload.roots[:] = [head]
+
+        for _ in range(99):
+            head = workload.allocate(Indirection(head))
+            workload.roots[0] = head
+
+    return size // 100 * 100
+
+
+def read_barrier(workload, size):
+    """
+    Keeps a ring of 1000 live indirections and walks 20 steps along it after
+    each allocation, so that most reads are done while scanning.
+    """
+    ring = [workload.allocate(Indirection(None)) for _ in range(1000)]
+
+    for cell, following in zip(ring, ring[1:] + ring[:1]):
+        workload.heap.write(cell, Indirection(following))
+
+    workload.roots.append(ring[0])
+    cell = ring[0]
+
+    for _ in range(size - len(ring)):
+        workload.allocate(Integer(0))
+
+        for _ in range(20):
+            cell = workload.heap.read(cell).object
+
+    return size
+
+
+def startup(workload, size):
+    """
+    Allocates live cells only, starting with a heap of one cell, so the heap
+    is expanded over and over.
+    """
+    for _ in range(size):
+        workload.roots.append(workload.allocate(None))
+
+    return size
+
+
+CASES = {
+    'empty': (empty, {}),
+    'growing': (growing, {}),
+    'linked_list': (linked_list, {}),
+    'read_barrier': (read_barrier, {}),
+    'startup': (startup, {'initial_size': 1, 'growth_factor': 1.5}),
+}
+
+
+def run_case(case, heap_class, size):
+    """
+    Runs the case three times, once timed, once recording the allocation
+    pauses and once tracing the memory, so that each measurement does not
+    disturb the others. Returns the results as a dictionary.
+    """
+    function, kwargs = CASES[case]
+
+    # keep Python's cyclic collector from adding its own pauses
+    gc.disable()
+
+    try:
+        workload = Workload(heap_class, **kwargs)
+        start = time.perf_counter()
+        num_allocations = function(workload, size)
+        elapsed = time.perf_counter() - start
+        metrics = workload.heap.metrics()
+
+        stats = HeapStats(record_pauses=True)
+        function(Workload(heap_class, stats=stats, **kwargs), size)
+        pauses = stats.pauses
+        phase_pauses = stats.phase_pauses
+
+        tracemalloc.start()
+        workload = Workload(heap_class, **kwargs)
+        function(workload, size)
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        gc.enable()
+
+    return {
+        'allocations_per_second': num_allocations / elapsed,
+        'bytes_per_cell': used / workload.heap.num_total,
+        'pause_p50_ns': pauses.percentile(50),
+        'pause_p99_ns': pauses.percentile(99),
+        'pause_p999_ns': pauses.percentile(99.9),
+        'pause_max_ns': pauses.max,
+        'scan_p99_ns': phase_pauses['scan'].percentile(99),
+        'expand_p99_ns': phase_pauses['expand'].percentile(99),
+        'flip_p99_ns': phase_pauses['flip'].percentile(99),
+        'scanned_per_allocation': metrics['scanned_cells'] / num_allocations,
+        'num_total': metrics['num_total'],
+    }
+
+
+def revision():
+    """
+    Returns the current git commit, or None outside of a git checkout.
+    """
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.decode().strip()
+
+
+def run(cases, size):
+    """
+    Runs the cases on all heap classes. Returns the results keyed by case and
+    heap class name, with the revision and Python version they were run on.
+    """
+    results = {}
+
+    for case in cases:
+        for heap_class in HEAP_CLASSES:
+            results.setdefault(case, {})[heap_class.__name__] = run_case(case, heap_class, size)
+
+    return {
+        'revision': revision(),
+        'python': platform.python_version(),
+        'size': size,
+        'results': results,
+    }
+
+
+def print_results(report):
+    print('{:>14} {:>10} {:>14} {:>10} {:>10} {:>10} {:>10} {:>12}'.format(
+        'case', 'heap', 'allocations/s', 'bytes/cell', 'p50 ns', 'p99 ns', 'max ns', 'scanned/alloc'))
+
+    for case, heaps in report['results'].items():
+        for heap, result in heaps.items():
+            print('{:>14} {:>10} {:>14.0f} {:>10.1f} {:>10} {:>10} {:>10} {:>12.2f}'.format(
+                case, heap, result['allocations_per_second'], result['bytes_per_cell'],
+                result['pause_p50_ns'], result['pause_p99_ns'], result['pause_max_ns'],
+                result['scanned_per_allocation']))
+
+
+def compare(report, baseline, tolerance):
+    """
+    Prints the metrics that got worse than in the baseline by more than the
+    tolerance, a fraction of the baseline value. Returns the number of such
+    regressions.
+    """
+    regressions = 0
+
+    for case, heaps in report['results'].items():
+        for heap, result in heaps.items():
+            old_result = baseline['results'].get(case, {}).get(heap)
+
+            if old_result is None:
+                continue
+
+            for metric, value in sorted(result.items()):
+                old_value = old_result.get(metric)
+
+                if not old_value:
+                    continue
+
+                change = (value - old_value) / old_value
+
+                if metric in HIGHER_IS_BETTER:
+                    change = -change
+
+                if change > tolerance:
+                    regressions += 1
+                    print('{} {} {}: {:.4g} -> {:.4g} ({:+.0%})'.format(
+                        case, heap, metric, old_value, value, change))
+
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Runs the treadmill benchmark cases.')
+    parser.add_argument('cases', nargs='*',
+                        help='cases to run, all by default, out of: ' + ', '.join(sorted(CASES)))
+    parser.add_argument('--size', type=int, default=50000,
+                        help='number of allocations per case')
+    parser.add_argument('--output', help='file to save the results to as JSON')
+    parser.add_argument('--compare', help='JSON file with results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='fraction by which a metric may get worse when comparing')
+    args = parser.parse_args(args)
+
+    for case in args.cases:
+        if case not in CASES:
+            parser.error('unknown case: {}'.format(case))
+
+    report = run(args.cases or sorted(CASES), args.size)
+    print_results(report)
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+        regressions = compare(report, baseline, args.tolerance)
+        print('{} regressions compared to {}'.format(regressions, baseline['revision']))
+
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Measures the allocation throughput with tracing off, with tracing to a ring
+buffer and with every event logged.
+
+Run with `python -m benchmarks.tracing`.
+"""
+import logging
+import os
+import time
+
+from treadmill import Heap
+from treadmill.trace import RingBufferTracer, LoggingTracer
+
+NUM_ALLOCATIONS = 200000
+
+
+def run(tracer):
+    """
+    Returns the number of allocations per second, when allocating cells while
+    keeping the last 100 allocated cells live.
+    """
+    live = []
+    heap = Heap(lambda: live, lambda cell: (), tracer=tracer)
+
+    start = time.perf_counter()
+
+    for _ in range(NUM_ALLOCATIONS):
+        live.append(heap.allocate())
+
+        if len(live) > 100:
+            live.pop(0)
+
+    return NUM_ALLOCATIONS / (time.perf_counter() - start)
+
+
+def main():
+    logger = logging.getLogger('benchmarks.tracing')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+
+    with open(os.devnull, 'w') as devnull:
+        logger.addHandler(logging.StreamHandler(devnull))
+
+        configurations = (
+            ('off', None),
+            ('ring buffer', RingBufferTracer()),
+            ('logging', LoggingTracer(logger)),
+        )
+
+        print('{:>12} {:>14}'.format('tracing', 'allocations/s'))
+
+        for name, tracer in configurations:
+            print('{:>12} {:>14.0f}'.format(name, run(tracer)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
+from typing import Optional
+
 from episcopal.runtime import RuntimeObject
 
 
-def get_children(obj: RuntimeObject):
+def get_children(obj: Optional[RuntimeObject]):
     """
-    Returns all children of the specified cell value.
+    Returns all children of the specified cell value. Cells that were not
+    written yet hold None and have no children, neither do leaf objects.
     """
+    if obj is None or obj.leaf:
+        return ()
+
     return obj.children()
@@ -4,66 +4,129 @@ from treadmill import Cell
 
 
 class RuntimeObject:
+    __slots__ = ()
+
+    # set on types that never have children, so they are not asked for them
+    leaf = False
+
     def children(self) -> Iterable[Cell]:
         """
-        Returns all children cells of this runtime object.
+        Returns all children cells of this runtime object. Objects with
+        children keep them in one tuple, which is returned without copying.
         """
         return ()
 
 
 class Integer(RuntimeObject):
+    __slots__ = ('value',)
+    leaf = True
+
     def __init__(self, value: int):
         self.value = value
 
 
 class Double(RuntimeObject):
+    __slots__ = ('value',)
+    leaf = True
+
     def __init__(self, value: float):
         self.value = value
 
 
 class Percentage(RuntimeObject):
+    __slots__ = ('value',)
+    leaf = True
+
     def __init__(self, value: float):
         self.value = value
 
 
 class Boolean(RuntimeObject):
+    __slots__ = ('value',)
+    leaf = True
+
     def __init__(self, value: bool):
         self.value = value
 
 
 class Distribution(RuntimeObject):
+    __slots__ = ('cells',)
+
     def __init__(self, type: Cell, n: Cell, elements: List[Cell]):
-        self.type = type
-        self.n = n
-        self.elements = elements
+        # the children are kept in one tuple, the fields are at fixed offsets
+        # and the elements follow them
+        self.cells = (type, n) + tuple(elements)
+
+    @property
+    def type(self):
+        return self.cells[0]
+
+    @property
+    def n(self):
+        return self.cells[1]
+
+    @property
+    def elements(self):
+        return list(self.cells[2:])
 
     def children(self):
-        return [self.type, self.n] + self.elements
+        return self.cells
 
 
 class ParamDistribution(RuntimeObject):
+    __slots__ = ('cells', 'num_parameters')
+
     def __init__(self, type: Cell, m: Cell, parameters: List[Cell], n: Cell, elements: List[Cell]):
-        self.type = type
-        self.m = m
-        self.parameters = parameters
-        self.n = n
-        self.elements = elements
+        # the parameters and the elements follow the fixed fields
+        self.cells = (type, m, n) + tuple(parameters) + tuple(elements)
+        self.num_parameters = len(parameters)
+
+    @property
+    def type(self):
+        return self.cells[0]
+
+    @property
+    def m(self):
+        return self.cells[1]
+
+    @property
+    def n(self):
+        return self.cells[2]
+
+    @property
+    def parameters(self):
+        return list(self.cells[3:3 + self.num_parameters])
+
+    @property
+    def elements(self):
+        return list(self.cells[3 + self.num_parameters:])
 
     def children(self):
-        return [self.type, self.m, self.n] + self.parameters + self.elements
+        return self.cells
 
 
 class Function(RuntimeObject):
+    __slots__ = ('closure', 'cells')
+
     def __init__(self, closure, n: Cell, parameters: List[Cell]):
         self.closure = closure
-        self.n = n
-        self.parameters = parameters
+        self.cells = (n,) + tuple(parameters)
+
+    @property
+    def n(self):
+        return self.cells[0]
+
+    @property
+    def parameters(self):
+        return list(self.cells[1:])
 
     def children(self):
-        return [self.n] + self.parameters
+        return self.cells
 
 
 class Indirection(RuntimeObject):
+    __slots__ = ('object',)
+
     def __init__(self, obj: Optional[Cell]):
         self.object = obj
 
@@ -75,5 +138,8 @@ class Indirection(RuntimeObject):
 
 
 class Id(RuntimeObject):
+    __slots__ = ('id',)
+    leaf = True
+
     def __init__(self, id: int):
         self.id = id
@@ -0,0 +1,30 @@
+from episcopal.garbage import get_children
+from episcopal.runtime import Distribution, Integer, Indirection, ParamDistribution
+from treadmill import Cell
+
+
+def test_objects_have_no_dict():
+    assert not hasattr(Integer(1), '__dict__')
+    assert not hasattr(Distribution(Cell(), Cell(), []), '__dict__')
+
+
+def test_children_of_param_distribution():
+    cells = [Cell() for _ in range(6)]
+    obj = ParamDistribution(cells[0], cells[1], cells[2:4], cells[4], cells[5:])
+
+    assert list(get_children(obj)) == [cells[0], cells[1], cells[4], cells[2], cells[3], cells[5]]
+
+
+def test_leaves_and_unwritten_cells_have_no_children():
+    assert get_children(Integer(1)) == ()
+    assert get_children(None) == ()
+    assert get_children(Indirection(None)) == ()
+
+
+def test_fields_are_read_from_children():
+    cells = [Cell() for _ in range(6)]
+    obj = ParamDistribution(cells[0], cells[1], cells[2:4], cells[4], cells[5:])
+
+    assert (obj.type, obj.m, obj.n) == (cells[0], cells[1], cells[4])
+    assert obj.parameters == cells[2:4]
+    assert obj.elements == cells[5:]
@@ -18,7 +18,7 @@ heap = treadmill.Heap(heap_roots, heap_children)
 
 def allocate():
     cell = heap.allocate()
-    heap.write(cell, Integer(123))
+    heap.write_scalar(cell, Integer, 123)
     return cell
 
 for _ in range(2000):
@@ -0,0 +1,57 @@
+import threading
+
+import treadmill
+from episcopal.garbage import get_children
+from episcopal.runtime import Integer
+
+NUM_THREADS = 4
+
+live_objects = [[] for _ in range(NUM_THREADS)]
+returned_live = []
+
+def heap_roots():
+    return [cell for objects in live_objects for cell in objects]
+
+def heap_children(cell):
+    value = heap.read(cell)
+
+    # cells in allocation buffers hold None until they are written
+    if value is None:
+        return ()
+
+    return get_children(value)
+
+heap = treadmill.ThreadSafeHeap(heap_roots, heap_children)
+
+def allocate():
+    cell = heap.allocate()
+    heap.write(cell, Integer(123))
+    return cell
+
+def mutate(objects):
+    for _ in range(2000):
+        if len(objects) < 100:
+            objects.append(allocate())
+        else:
+            objects.pop(0)
+
+            live = allocate()
+
+            if any(live in other for other in live_objects):
+                returned_live.append(live)
+
+            objects.append(live)
+
+threads = [threading.Thread(target=mutate, args=(objects,)) for objects in live_objects]
+
+for thread in threads:
+    thread.start()
+
+for thread in threads:
+    thread.join()
+
+print(heap.string())
+
+if returned_live:
+    print('Returned live object!')
+    exit(1)
@@ -1,2 +1,10 @@
 from .heap import Heap
 from .cell import Cell
+from .arena import ArenaHeap
+from .concurrent import ThreadSafeHeap, ConcurrentHeap
+from .generational import GenerationalHeap
+from .shrink import ShrinkPolicy
+from .pacing import Pacer
+from .roots import RootSet
+from .stats import HeapStats
+from .weak import WeakCell
@@ -0,0 +1,484 @@
+import heapq
+import struct
+from array import array
+
+from treadmill.heap import Heap
+
+# mark of cells that have never been allocated, it is neither True nor False
+UNMARKED = 2
+
+
+class Arena:
+    """
+    Stores cells in preallocated parallel arrays instead of separate objects.
+    A cell is an integer handle, which is an index into the arrays.
+    """
+
+    def __init__(self, segment_size: int = 1024):
+        self.previous = array('l')
+        self.next = array('l')
+        self.marks = bytearray()
+        self.values = []
+        # the tags of cells holding unboxed scalars, None for other cells
+        self.tags = []
+
+        # the arrays are divided into segments, a segment at the end of the
+        # arrays is trimmed once all of its cells are released, which is why
+        # released cells are kept in a min-heap and the lowest ones are reused
+        self.segment_size = segment_size
+        self.released = []
+        self.released_counts = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def create_cells(self, size):
+        """
+        Creates the specified number of cells, linked into a cyclic list.
+        Released cells are reused before the arrays grow. Returns the first
+        cell.
+        """
+        num_reused = min(size, len(self.released))
+        first = None
+
+        if num_reused < size:
+            first = self.extend(size - num_reused)
+
+        for _ in range(num_reused):
+            cell = heapq.heappop(self.released)
+            self.released_counts[cell // self.segment_size] -= 1
+
+            if first is None:
+                self.previous[cell] = self.next[cell] = first = cell
+            else:
+                self.insert_after(cell, self.previous[first])
+
+        return first
+
+    def extend(self, size):
+        """
+        Adds the specified number of cells to the end of the arrays, linked
+        into a cyclic list. Returns the first cell.
+        """
+        first = len(self.values)
+        last = first + size - 1
+
+        self.previous.extend(range(first - 1, last))
+        self.next.extend(range(first + 1, last + 2))
+        self.marks.extend(bytes([UNMARKED]) * size)
+        self.values.extend([None] * size)
+        self.tags.extend([None] * size)
+
+        # close the list
+        self.previous[first] = last
+        self.next[last] = first
+
+        while len(self.released_counts) * self.segment_size < len(self.values):
+            self.released_counts.append(0)
+
+        return first
+
+    def release(self, cell):
+        """
+        Clears a cell that is no longer part of any list, so that it can be
+        reused or trimmed.
+        """
+        self.previous[cell] = self.next[cell] = -1
+        self.marks[cell] = UNMARKED
+        self.values[cell] = None
+        self.tags[cell] = None
+
+        heapq.heappush(self.released, cell)
+        self.released_counts[cell // self.segment_size] += 1
+
+    def replace(self, cell):
+        """
+        Puts the released cell with the lowest handle in place of cell, and
+        releases cell. Returns the replacement.
+        """
+        replacement = heapq.heappop(self.released)
+        self.released_counts[replacement // self.segment_size] -= 1
+
+        left = self.previous[cell]
+        right = self.next[cell]
+
+        self.next[left] = replacement
+        self.previous[right] = replacement
+
+        self.previous[replacement] = left
+        self.next[replacement] = right
+
+        self.marks[replacement] = self.marks[cell]
+
+        self.release(cell)
+
+        return replacement
+
+    def trim(self):
+        """
+        Removes segments at the end of the arrays that contain only released
+        cells. Returns the number of removed cells.
+        """
+        size = len(self.values)
+
+        while self.released_counts:
+            start = (len(self.released_counts) - 1) * self.segment_size
+
+            if self.released_counts[-1] != size - start:
+                break
+
+            self.released_counts.pop()
+            size = start
+
+        trimmed = len(self.values) - size
+
+        if trimmed > 0:
+            del self.previous[size:]
+            del self.next[size:]
+            del self.marks[size:]
+            del self.values[size:]
+
+            self.released = [cell for cell in self.released if cell < size]
+            heapq.heapify(self.released)
+
+        return trimmed
+
+    def remove(self, cell):
+        """
+        Removes cell from its list.
+        """
+        left = self.previous[cell]
+        right = self.next[cell]
+
+        self.next[left] = right
+        self.previous[right] = left
+
+        self.next[cell] = -1
+        self.previous[cell] = -1
+
+    def insert_after(self, cell, left):
+        """
+        Inserts cell after left, assuming that left is already in a list.
+        """
+        right = self.next[left]
+
+        self.next[left] = cell
+        self.previous[right] = cell
+
+        self.previous[cell] = left
+        self.next[cell] = right
+
+    def move_after(self, cell, left):
+        """
+        Moves cell from its list to just after left, which must not be cell.
+        """
+        right = self.next[cell]
+        self.next[self.previous[cell]] = right
+        self.previous[right] = self.previous[cell]
+
+        self.insert_after(cell, left)
+
+    def splice(self, first, left):
+        """
+        Inserts the whole list starting with first after left, which is in
+        another list.
+        """
+        last = self.previous[first]
+        right = self.next[left]
+
+        self.next[left] = first
+        self.previous[first] = left
+
+        self.next[last] = right
+        self.previous[right] = last
+
+    def iterate(self, cell):
+        """
+        Yields all cells in the list, starting with cell.
+        """
+        first = cell
+
+        while True:
+            yield cell
+
+            cell = self.next[cell]
+
+            if cell == first:
+                break
+
+    def bytes_per_cell(self):
+        """
+        Returns the number of bytes the arena needs for each cell, not
+        counting the values themselves.
+        """
+        return self.previous.itemsize + self.next.itemsize + 1 + 2 * struct.calcsize('P')
+
+
+class ArenaHeap(Heap):
+    """
+    Heap whose cells are integer handles into an `Arena`. It has the same API
+    as `Heap`, but uses a fraction of the memory per cell.
+    """
+
+    def __init__(self, *args, segment_size: int = 1024, **kwargs):
+        self.arena = Arena(segment_size)
+        super().__init__(*args, **kwargs)
+
+    def create_free_cells(self, size):
+        return self.arena.create_cells(size)
+
+    def allocate(self):
+        """
+        Allocates a new cell and returns it. Continues or starts scanning if
+        needed, or expands the heap if there are no free cells left.
+        """
+        self.prepare_allocation()
+
+        cell = self.free
+        self.free = self.arena.next[cell]
+
+        self.num_free -= 1
+        self.num_allocated += 1
+
+        self.arena.marks[cell] = self.live_mark
+        self.arena.values[cell] = None
+        self.arena.tags[cell] = None
+
+        if self.bottom is None:
+            self.bottom = cell
+
+        return cell
+
+    def allocate_many(self, n: int):
+        """
+        Allocates n cells and returns them as a list. Does the scanning work
+        owed for n allocations at once and expands the heap at most once.
+        """
+        self.prepare_allocation(n)
+
+        cells = []
+        cell = self.free
+        marks = self.arena.marks
+        values = self.arena.values
+        tags = self.arena.tags
+        next_cells = self.arena.next
+
+        for _ in range(n):
+            marks[cell] = self.live_mark
+            values[cell] = None
+            tags[cell] = None
+            cells.append(cell)
+            cell = next_cells[cell]
+
+        self.free = cell
+
+        self.num_free -= n
+        self.num_allocated += n
+
+        if self.bottom is None and cells:
+            self.bottom = cells[0]
+
+        return cells
+
+    def read(self, cell):
+        """
+        Returns the value stored in the cell. Automatically marks the cell as
+        live.
+        """
+        if self.is_scanning() and self.arena.marks[cell] != self.live_mark:
+            self.stats.read_barrier_hits += 1
+            self.mark_to_scan(cell)
+
+        tag = self.arena.tags[cell]
+
+        if tag is not None:
+            return tag(self.arena.values[cell])
+
+        return self.arena.values[cell]
+
+    def write(self, cell, value):
+        """
+        Writes the value to the cell.
+        """
+        self.arena.values[cell] = value
+        self.arena.tags[cell] = None
+
+    def write_scalar(self, cell, tag, payload):
+        self.write(cell, payload)
+        self.arena.tags[cell] = tag
+
+    def children(self, cell):
+        if self.arena.tags[cell] is not None:
+            return ()
+
+        return self.get_children(cell)
+
+    def plain_read(self, cell):
+        tag = self.arena.tags[cell]
+
+        if tag is not None:
+            return tag(self.arena.values[cell])
+
+        return self.arena.values[cell]
+
+    def barriered_write(self, cell, value):
+        if self.is_scanning():
+            self.stats.write_barrier_hits += 1
+
+            for child in self.children(cell):
+                self.mark_to_scan(child)
+
+        self.arena.values[cell] = value
+        self.arena.tags[cell] = None
+
+    def advance_scan(self):
+        """
+        Finishes scanning the scan cell, whose children were marked, and moves
+        to the next grey cell. Returns False if scanning finished.
+        """
+        self.num_scanned += 1
+
+        previous = self.arena.previous[self.scan]
+
+        if self.top is not None and previous == self.top:
+            self.scan = None
+            self.collect()
+            return False
+
+        elif self.scan == self.bottom:
+            self.scan = None
+            self.stats.empty_cycles += 1
+            self.start_scanning()
+            return False
+
+        else:
+            self.scan = previous
+            return True
+
+    def mark_to_scan(self, cell):
+        """
+        Marks cell to be scanned, if it isn't already and if it has not been
+        scanned yet.
+        """
+        assert self.bottom is not None
+
+        marks = self.arena.marks
+
+        if marks[cell] == self.live_mark:
+            return
+
+        assert self.top is not None
+
+        marks[cell] = self.live_mark
+
+        if cell == self.bottom and cell == self.top:
+            self.top = None
+        elif cell == self.bottom:
+            self.bottom = self.arena.next[cell]
+            self.arena.move_after(cell, self.top)
+        elif cell == self.top:
+            self.top = self.arena.previous[cell]
+        else:
+            self.arena.move_after(cell, self.top)
+
+    def is_marked(self, cell):
+        return self.arena.marks[cell] == self.live_mark
+
+    def expand(self, size: int = None):
+        """
+        Creates n free cells and adds them to the heap, where n = size or the
+        next expansion size.
+        """
+        if size is None:
+            size = self.next_expand_size()
+
+        arena = self.arena
+
+        # insert the new cells into the list, after the current free cell
+        arena.splice(arena.create_cells(size), self.free)
+
+        self.num_total += size
+        self.num_free += size
+
+        self.stats.record_expansion(size)
+
+    def shrink(self, first_garbage, num_garbage: int):
+        """
+        Releases some of the just collected cells if the shrink policy asks
+        for it. Then moves the remaining collected cells out of the segments
+        at the end of the arena, and trims the segments that become empty.
+        """
+        if self.shrink_policy is None:
+            return
+
+        size = self.shrink_policy.release_size(self, num_garbage)
+        cell = first_garbage
+
+        if size > 0:
+            cell = self.release(first_garbage, size)
+
+        if self.arena.released:
+            self.compact(cell, min(num_garbage - size, self.arena.segment_size))
+
+        trimmed = self.arena.trim()
+
+        if trimmed > 0:
+            self.stats.record_release(trimmed, trimmed * self.bytes_per_cell())
+
+    def release(self, first, size: int):
+        """
+        Removes n free cells from the heap, starting with first, where
+        n = size. The cells can be reused by the arena, or trimmed once their
+        segment has no other cells. Returns the cell following the removed
+        ones.
+        """
+        arena = self.arena
+
+        left = arena.previous[first]
+        cell = first
+
+        for _ in range(size):
+            following = arena.next[cell]
+            arena.release(cell)
+            cell = following
+
+        arena.next[left] = cell
+        arena.previous[cell] = left
+
+        self.num_total -= size
+        self.num_free -= size
+
+        return cell
+
+    def compact(self, first, size: int):
+        """
+        Swaps n free cells, starting with first, for released cells in lower
+        segments, where n = size. Free cells hold no data, so this lets the
+        arena trim segments at its end.
+        """
+        arena = self.arena
+        segment_size = arena.segment_size
+        cell = first
+
+        for _ in range(size):
+            following = arena.next[cell]
+
+            if arena.released and arena.released[0] // segment_size < cell // segment_size:
+                arena.replace(cell)
+
+            cell = following
+
+    def bytes_per_cell(self):
+        return self.arena.bytes_per_cell()
+
+    def cell_before(self, cell):
+        return self.arena.previous[cell]
+
+    def cell_after(self, cell):
+        return self.arena.next[cell]
+
+    def iterate(self, cell):
+        """
+        Yields all cells in the treadmill, starting with cell.
+        """
+        return self.arena.iterate(cell)
@@ -0,0 +1,199 @@
+import random
+
+from treadmill.arena import Arena, ArenaHeap
+from treadmill.shrink import ShrinkPolicy
+
+
+def dummy_get_roots():
+    return ()
+
+
+def dummy_get_children(obj):
+    return ()
+
+
+def test_create_cells():
+    arena = Arena()
+    first = arena.create_cells(10)
+
+    assert first == 0
+    assert list(arena.iterate(first)) == list(range(10))
+    assert arena.previous[0] == 9
+
+
+def test_create_cells_appends():
+    arena = Arena()
+    arena.create_cells(3)
+    first = arena.create_cells(2)
+
+    assert first == 3
+    assert list(arena.iterate(first)) == [3, 4]
+    assert len(arena) == 5
+
+
+def test_remove_and_insert_after():
+    arena = Arena()
+    first = arena.create_cells(3)
+
+    arena.remove(1)
+    arena.insert_after(1, 2)
+
+    assert list(arena.iterate(first)) == [0, 2, 1]
+
+
+def test_first_allocation():
+    heap = ArenaHeap(get_roots=dummy_get_roots,
+                     get_children=dummy_get_children,
+                     initial_size=10)
+
+    allocated = heap.allocate()
+
+    assert allocated == 0
+    assert heap.free == 1
+    assert heap.bottom == 0
+    assert heap.num_free == 9
+    assert heap.arena.marks[allocated] == heap.live_mark
+
+
+def test_read_and_write():
+    heap = ArenaHeap(get_roots=dummy_get_roots,
+                     get_children=dummy_get_children,
+                     initial_size=1)
+
+    cell = heap.allocate()
+    heap.write(cell, 123)
+
+    assert heap.read(cell) == 123
+
+
+def test_allocate_expands():
+    heap = ArenaHeap(get_roots=dummy_get_roots,
+                     get_children=dummy_get_children,
+                     initial_size=1,
+                     expand_size=10)
+
+    heap.allocate()
+
+    assert heap.num_total == 11
+    assert len(list(heap.iterate(heap.free))) == 11
+
+
+def test_never_returns_live_cell():
+    live = []
+
+    def get_children(cell):
+        child = heap.read(cell)
+        return (child,) if child is not None else ()
+
+    heap = ArenaHeap(get_roots=lambda: live,
+                     get_children=get_children)
+
+    rng = random.Random(0)
+
+    for _ in range(2000):
+        cell = heap.allocate()
+        assert cell not in live
+
+        # link some of the cells to a live one, so they are only reachable as children
+        if live and rng.random() < 0.3:
+            heap.write(cell, None)
+            heap.write(rng.choice(live), cell)
+        else:
+            live.append(cell)
+
+        if len(live) > 100:
+            live.pop(rng.randrange(len(live)))
+
+
+def test_allocate_many():
+    heap = ArenaHeap(get_roots=dummy_get_roots,
+                     get_children=dummy_get_children,
+                     initial_size=5,
+                     scan_threshold=0)
+
+    allocated = heap.allocate_many(8)
+
+    assert allocated == [0, 5, 6, 7, 8, 9, 10, 11]
+    assert heap.num_total == 15
+    assert heap.num_free == 7
+
+
+def test_released_cells_are_reused():
+    arena = Arena(segment_size=4)
+    arena.create_cells(8)
+
+    arena.remove(2)
+    arena.release(2)
+
+    first = arena.create_cells(3)
+
+    assert sorted(arena.iterate(first)) == [2, 8, 9]
+    assert len(arena) == 10
+    assert arena.released == []
+
+
+def test_trim_removes_released_segments():
+    arena = Arena(segment_size=4)
+    arena.create_cells(10)
+
+    for cell in (9, 8, 5, 4, 7, 6):
+        arena.remove(cell)
+        arena.release(cell)
+
+    assert arena.trim() == 6
+    assert len(arena) == 4
+    assert arena.released == []
+
+
+def test_trim_keeps_segments_in_use():
+    arena = Arena(segment_size=4)
+    arena.create_cells(10)
+
+    arena.remove(9)
+    arena.release(9)
+    arena.remove(4)
+    arena.release(4)
+
+    assert arena.trim() == 0
+    assert len(arena) == 10
+
+
+def test_heap_shrinks_and_trims_arena():
+    live = []
+
+    heap = ArenaHeap(get_roots=lambda: live,
+                     get_children=dummy_get_children,
+                     initial_size=10,
+                     segment_size=16,
+                     shrink_policy=ShrinkPolicy(delay=1))
+
+    for _ in range(500):
+        live.append(heap.allocate())
+
+    peak = len(heap.arena)
+    del live[10:]
+
+    # allocate short-lived cells only
+    for _ in range(500):
+        heap.allocate()
+
+    assert len(heap.arena) < peak / 2
+    assert heap.stats.released_bytes == heap.stats.released_cells * heap.bytes_per_cell()
+    assert len(list(heap.iterate(heap.free))) == heap.num_total
+
+
+def test_write_scalar_is_boxed_on_read():
+    heap = ArenaHeap(get_roots=dummy_get_roots,
+                     get_children=dummy_get_children,
+                     initial_size=2)
+
+    cell = heap.allocate()
+    heap.write_scalar(cell, str, 123)
+
+    assert heap.arena.values[cell] == 123
+    assert heap.read(cell) == '123'
+    assert heap.children(cell) == ()
+
+    heap.write(cell, 456)
+
+    assert heap.read(cell) == 456
@@ -2,6 +2,11 @@ from treadmill.list import iterate
 
 
 class Cell:
+    # set on cells promoted to the old treadmill of a GenerationalHeap
+    old = False
+    # set on cells holding an unboxed scalar, the value is then its payload
+    tag = None
+
     def __init__(self):
         self.mark = None
         self.previous = None
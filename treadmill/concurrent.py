@@ -0,0 +1,210 @@
+import threading
+import time
+
+from treadmill.heap import Heap
+
+
+class AllocationBuffer:
+    """
+    Free cells taken by one thread. Cells from `position` on are handed out
+    by the next allocations, cells from `returned` on are either unused or
+    were returned by the last allocation.
+    """
+
+    def __init__(self, cells):
+        self.cells = cells
+        self.position = 0
+        self.returned = 0
+
+
+class ThreadSafeHeap(Heap):
+    """
+    A heap that can be shared by several threads. Each thread takes
+    `buffer_size` free cells at a time into its own allocation buffer and
+    allocates from it without locking. The treadmill pointers, the counters
+    and the live mark are guarded by one reentrant lock, which is taken to
+    refill a buffer, and by the read barrier to mark a cell.
+
+    get_roots has to return the cells held by all threads, as a flip by one
+    thread can happen while the others run. The exception are the cells
+    returned by the last allocation of each thread, which the heap keeps as
+    roots until the thread allocates again, together with the unused cells
+    in the buffers. Buffered cells hold None until they are written, so
+    get_children has to accept them.
+    """
+
+    def __init__(self, *args, buffer_size: int = 16, **kwargs):
+        self.lock = threading.RLock()
+        self.buffer_size = buffer_size
+
+        # allocation buffers by thread identifier, and of the current thread
+        self.buffers = {}
+        self.local = threading.local()
+
+        super().__init__(*args, **kwargs)
+
+        self.get_mutator_roots = self.get_roots
+        self.get_roots = self.get_all_roots
+
+    def get_all_roots(self):
+        """
+        Returns the roots of the mutators and the cells in the allocation
+        buffers that may not be reachable from them. Drops the buffers of
+        threads that have finished.
+        """
+        roots = list(self.get_mutator_roots())
+        alive = {thread.ident for thread in threading.enumerate()}
+
+        for ident, buffer in list(self.buffers.items()):
+            if ident in alive:
+                roots.extend(buffer.cells[buffer.returned:])
+            else:
+                del self.buffers[ident]
+
+        return roots
+
+    def allocate(self):
+        buffer = getattr(self.local, 'buffer', None)
+
+        if buffer is None or buffer.position == len(buffer.cells):
+            buffer = self.refill(self.buffer_size)
+
+        position = buffer.position
+        cell = buffer.cells[position]
+
+        # the cell stays a root until the next allocation
+        buffer.returned = position
+        buffer.position = position + 1
+
+        return cell
+
+    def allocate_many(self, n: int):
+        buffer = getattr(self.local, 'buffer', None)
+
+        if buffer is None or buffer.position + n > len(buffer.cells):
+            buffer = self.refill(max(n, self.buffer_size))
+
+        position = buffer.position
+        cells = buffer.cells[position:position + n]
+
+        buffer.returned = position
+        buffer.position = position + n
+
+        return cells
+
+    def refill(self, size: int):
+        """
+        Replaces the allocation buffer of the current thread with n new cells,
+        where n = size. The unused cells of the old buffer become garbage.
+        """
+        with self.lock:
+            cells = Heap.allocate_many(self, size)
+            buffer = AllocationBuffer(cells)
+            self.buffers[threading.get_ident()] = buffer
+            self.local.buffer = buffer
+
+        return buffer
+
+    def mark_to_scan(self, cell):
+        with self.lock:
+            super().mark_to_scan(cell)
+
+    def register_finalizer(self, cell, callback):
+        with self.lock:
+            super().register_finalizer(cell, callback)
+
+    def weak(self, cell):
+        with self.lock:
+            return super().weak(cell)
+
+
+class ConcurrentHeap(ThreadSafeHeap):
+    """
+    A thread-safe heap whose scan steps are done by a background collector
+    thread. The mutator threads only refill their allocation buffers and run
+    the read barrier, and scan inline only if the collector falls behind.
+
+    The collector takes the lock for `collector_batch_size` scan steps at a
+    time. The live mark is only flipped by a mutator refilling its buffer,
+    never by the collector, because the roots returned by get_roots are only
+    complete while the mutators are in a heap method. When a cycle finds no
+    garbage, the collector asks the next refill to flip.
+    """
+
+    def __init__(self, *args, collector_batch_size: int = 64, **kwargs):
+        self.collector_batch_size = collector_batch_size
+
+        # set by the collector when the next refill should start scanning
+        self.flip_requested = False
+        self.stopped = False
+
+        super().__init__(*args, **kwargs)
+
+        self.condition = threading.Condition(self.lock)
+        self.collector = threading.Thread(target=self.run_collector,
+                                          name='treadmill-collector',
+                                          daemon=True)
+        self.collector.start()
+
+    def stop(self):
+        """
+        Stops the collector thread and waits for it to finish. Scanning
+        continues inline in the allocating threads.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+        self.collector.join()
+
+    def run_collector(self):
+        """
+        Does the scan steps while there is scanning to do.
+        """
+        while True:
+            with self.condition:
+                while not self.stopped and not self.is_scanning():
+                    self.condition.wait()
+
+                if self.stopped:
+                    return
+
+                self.scan_cycle(self.collector_batch_size)
+
+            # let the mutators take the lock between batches
+            time.sleep(0)
+
+    def prepare_allocation(self, n: int = 1):
+        """
+        Starts scanning if needed and wakes the collector. Scans inline only if
+        the collector falls behind the pace of scan_step_size cells per
+        allocation, or if the collector was stopped.
+        """
+        if not self.is_scanning() and (self.flip_requested or self.needs_collecting()):
+            self.flip_requested = False
+            self.start_scanning()
+
+            if self.is_scanning():
+                self.condition.notify()
+
+        if self.is_scanning() and (self.stopped or self.is_behind()):
+            self.scan_allocation(n)
+
+        if self.is_full(n):
+            self.expand(max(self.next_expand_size(), n + 1 - self.num_free))
+
+    def is_behind(self):
+        """
+        Checks if the collector is more than one batch behind the cells the
+        allocations would have scanned inline since scanning started.
+        """
+        owed = self.num_allocated * self.scan_step_size
+        return self.num_scanned + self.collector_batch_size < owed
+
+    def start_scanning(self):
+        if threading.current_thread() is self.collector:
+            # a cycle without garbage restarts scanning, which has to wait
+            # for the mutator
+            self.flip_requested = True
+        else:
+            super().start_scanning()
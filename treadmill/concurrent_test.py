@@ -0,0 +1,189 @@
+import random
+import threading
+import time
+
+from treadmill.concurrent import ThreadSafeHeap, ConcurrentHeap
+
+
+def dummy_get_children(obj):
+    return ()
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.perf_counter() + timeout
+
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.001)
+
+
+def test_collector_scans_in_background():
+    live = []
+
+    heap = ConcurrentHeap(get_roots=lambda: live,
+                          get_children=dummy_get_children,
+                          initial_size=20,
+                          scan_step_size=0,
+                          buffer_size=1)
+
+    live.append(heap.allocate())
+
+    # the last allocation starts scanning
+    for _ in range(16):
+        heap.allocate()
+
+    assert heap.is_scanning()
+
+    # the allocations do no scan work, so the collector has to collect
+    wait_until(lambda: heap.stats.cycles_completed == 1)
+    heap.stop()
+
+    # the cell allocated before the flip is kept as well
+    assert heap.stats.reclaimed_cells == 14
+
+
+def test_collector_requests_flip_without_garbage():
+    live = []
+
+    heap = ConcurrentHeap(get_roots=lambda: live,
+                          get_children=dummy_get_children,
+                          initial_size=10,
+                          scan_step_size=0,
+                          buffer_size=1)
+
+    # the last allocation starts scanning, all cells are live
+    for _ in range(9):
+        live.append(heap.allocate())
+
+    wait_until(lambda: heap.flip_requested)
+
+    assert not heap.is_scanning()
+
+    live.append(heap.allocate())
+    heap.stop()
+
+    assert not heap.flip_requested
+    assert heap.stats.cycles_started == 2
+
+
+def test_stop_scans_inline():
+    live = []
+
+    heap = ConcurrentHeap(get_roots=lambda: live,
+                          get_children=dummy_get_children,
+                          initial_size=10,
+                          buffer_size=1)
+    heap.stop()
+
+    for _ in range(100):
+        heap.allocate()
+
+    assert not heap.collector.is_alive()
+    assert heap.num_total == 10
+
+
+def run_mutators(heap_class, **kwargs):
+    live = [[] for _ in range(4)]
+    errors = []
+
+    def get_roots():
+        return [cell for cells in live for cell in cells]
+
+    def get_children(cell):
+        child = heap.read(cell)
+        return (child,) if child is not None else ()
+
+    heap = heap_class(get_roots=get_roots,
+                      get_children=get_children,
+                      **kwargs)
+
+    def mutate(cells, seed):
+        rng = random.Random(seed)
+
+        for _ in range(2000):
+            cell = heap.allocate()
+            heap.write(cell, None)
+
+            if any(cell in other for other in live):
+                errors.append(cell)
+
+            # link some of the cells to a live one, so they are only reachable as children
+            if cells and rng.random() < 0.3:
+                heap.write(rng.choice(cells), cell)
+            else:
+                cells.append(cell)
+
+            if len(cells) > 50:
+                cells.pop(rng.randrange(len(cells)))
+
+    threads = [threading.Thread(target=mutate, args=(cells, seed))
+               for seed, cells in enumerate(live)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return heap, errors
+
+
+def test_never_returns_live_cell_with_several_threads():
+    heap, errors = run_mutators(ConcurrentHeap, collector_batch_size=8)
+    heap.stop()
+
+    assert errors == []
+    assert heap.stats.cycles_completed > 0
+
+
+def test_thread_safe_heap_never_returns_live_cell():
+    for buffer_size in (1, 16):
+        heap, errors = run_mutators(ThreadSafeHeap, buffer_size=buffer_size)
+
+        assert errors == []
+        assert heap.stats.cycles_completed > 0
+
+
+def test_allocate_takes_cells_from_buffer():
+    heap = ThreadSafeHeap(get_roots=lambda: (),
+                          get_children=dummy_get_children,
+                          initial_size=30,
+                          buffer_size=8)
+
+    first = heap.allocate()
+
+    assert heap.num_free == 22
+    assert heap.local.buffer.cells[0] is first
+
+    cells = heap.allocate_many(3) + [heap.allocate() for _ in range(4)]
+
+    # the buffer is used up, the next allocation refills it
+    assert cells == heap.local.buffer.cells[1:]
+    assert heap.num_free == 22
+
+    heap.allocate()
+
+    assert heap.num_free == 14
+
+
+def test_buffered_cells_survive_flip():
+    live = []
+
+    heap = ThreadSafeHeap(get_roots=lambda: live,
+                          get_children=dummy_get_children,
+                          initial_size=30,
+                          buffer_size=8)
+
+    live.append(heap.allocate())
+    buffered = heap.local.buffer.cells[1:]
+
+    other_cells = []
+    other = threading.Thread(target=lambda: other_cells.extend(heap.allocate() for _ in range(100)))
+    other.start()
+    other.join()
+
+    # the other thread collected garbage, but the unused cells in this
+    # thread's buffer were kept
+    assert heap.stats.cycles_completed > 0
+    assert not set(buffered) & set(other_cells)
+    assert [heap.allocate() for _ in range(7)] == buffered
@@ -0,0 +1,233 @@
+from treadmill.heap import Heap
+from treadmill.list import cut, splice
+
+
+class OldGeneration(Heap):
+    """
+    The old treadmill of a GenerationalHeap. Its cells are never allocated by
+    the mutator, they are promoted from the nursery. Scanning is only started
+    by the generational heap, and collected cells are released instead of
+    being kept as free cells.
+    """
+
+    def __init__(self, *args, remembered: set = None, **kwargs):
+        self.remembered = remembered if remembered is not None else set()
+        # set when the generational heap starts a major cycle
+        self.flip_requested = False
+        # number of live cells found by the last major cycle
+        self.num_live = 0
+
+        super().__init__(*args, **kwargs)
+
+    def start_scanning(self):
+        if self.flip_requested:
+            self.flip_requested = False
+            super().start_scanning()
+        else:
+            # nothing is allocated in the old generation, so a cycle that
+            # finds no garbage ends instead of restarting
+            self.num_live = self.num_total - self.num_free
+
+    def shrink(self, first_garbage, num_garbage: int):
+        if num_garbage > 0:
+            self.release(first_garbage, num_garbage)
+
+        self.num_live = self.num_total - self.num_free
+
+    def release(self, first, size: int):
+        cell = first
+
+        # released cells must not be scanned as remembered cells
+        for _ in range(size):
+            self.remembered.discard(cell)
+            cell = cell.next
+
+        return super().release(first, size)
+
+    def adopt(self, first, size: int):
+        """
+        Adds n cells promoted from the nursery, where n = size, linked into a
+        list starting with first. They are added as allocated cells.
+        """
+        cell = first
+
+        for _ in range(size):
+            cell.old = True
+            cell.mark = self.live_mark
+            cell = cell.next
+
+        # insert the cells before the free cell, where allocated cells go
+        splice(first, self.free.previous)
+
+        self.num_total += size
+        # cells added while scanning are live, like allocated ones
+        self.num_allocated += size
+
+        if self.bottom is None:
+            self.bottom = first
+
+
+class GenerationalHeap(Heap):
+    """
+    A heap with two treadmills. New cells are allocated in the nursery, which
+    is the heap itself, and minor cycles trace only the nursery. The cells
+    that survive a minor cycle are promoted to the old treadmill, `old`,
+    which is traced by major cycles, once the old cells grow to
+    `major_growth` times the live cells found by the last major cycle.
+
+    A minor cycle takes as roots the young cells returned by get_roots and
+    the young children of the old cells in the remembered set, which write
+    records when an old cell gets a young child. All survivors are promoted,
+    so the remembered set is emptied by every minor collection. A major cycle
+    takes as roots the old cells returned by get_roots and the old children
+    of all young cells. Both cycles run incrementally, major cycles do
+    `major_scan_step_size` scan steps per allocation.
+    """
+
+    def __init__(self,
+                 get_roots,
+                 get_children,
+                 *args,
+                 major_growth: float = 2.0,
+                 major_scan_step_size: int = None,
+                 **kwargs):
+        if kwargs.get('barrier', 'read') != 'read':
+            raise ValueError('GenerationalHeap only supports the read barrier')
+
+        self.get_all_roots = get_roots
+        self.get_all_children = get_children
+        self.major_growth = major_growth
+
+        # old cells that may point to young cells
+        self.remembered = set()
+        self.num_promoted = 0
+
+        super().__init__(self.get_young_roots, self.get_young_children, *args, **kwargs)
+
+        # the nursery is topped up to its initial size after promotion
+        self.nursery_size = self.num_total
+
+        self.old = OldGeneration(self.get_old_roots,
+                                 self.get_old_children,
+                                 initial_size=1,
+                                 scan_step_size=major_scan_step_size or self.scan_step_size,
+                                 tracer=self.tracer,
+                                 remembered=self.remembered)
+
+    def all_children(self, cell):
+        """
+        Returns the children of the cell in both generations, without calling
+        get_children for unboxed scalars.
+        """
+        if cell.tag is not None:
+            return ()
+
+        return self.get_all_children(cell)
+
+    def get_young_roots(self):
+        roots = [cell for cell in self.get_all_roots() if not cell.old]
+
+        for cell in self.remembered:
+            roots.extend(child for child in self.all_children(cell) if not child.old)
+
+        return roots
+
+    def get_young_children(self, cell):
+        return [child for child in self.all_children(cell) if not child.old]
+
+    def get_old_roots(self):
+        roots = [cell for cell in self.get_all_roots() if cell.old]
+
+        if self.bottom is not None:
+            # all allocated young cells, from bottom up to the free cell
+            cell = self.bottom
+
+            while cell is not self.free:
+                roots.extend(child for child in self.all_children(cell) if child.old)
+                cell = cell.next
+
+        return roots
+
+    def get_old_children(self, cell):
+        return [child for child in self.all_children(cell) if child.old]
+
+    def prepare_allocation(self, n: int = 1):
+        super().prepare_allocation(n)
+
+        if self.old.is_scanning():
+            self.old.scan_cycle(n * self.old.scan_step_size)
+
+    def read(self, cell):
+        if cell.old:
+            return self.old.read(cell)
+
+        return super().read(cell)
+
+    def write(self, cell, value):
+        """
+        Writes the value to the cell. If an old cell gets a young child, the
+        cell is added to the remembered set.
+        """
+        cell.value = value
+        cell.tag = None
+
+        if cell.old and cell not in self.remembered:
+            if any(not child.old for child in self.all_children(cell)):
+                self.remembered.add(cell)
+
+    def write_scalar(self, cell, tag, payload):
+        # scalars have no children, so the cell is never remembered for them
+        cell.value = payload
+        cell.tag = tag
+
+    def register_finalizer(self, cell, callback):
+        raise NotImplementedError('GenerationalHeap does not support finalizers')
+
+    def weak(self, cell):
+        raise NotImplementedError('GenerationalHeap does not support weak cells')
+
+    def start_scanning(self):
+        super().start_scanning()
+
+        if not self.is_scanning():
+            # there were no roots and all young cells are free now
+            self.remembered.clear()
+
+    def collect(self):
+        super().collect()
+        self.promote()
+
+    def promote(self):
+        """
+        Moves all allocated young cells to the old treadmill, starts a major
+        cycle if the old cells grew enough, and tops up the nursery.
+        """
+        size = self.num_total - self.num_free
+
+        # the allocated cells are the ones from bottom up to the free cell
+        self.old.adopt(cut(self.bottom, self.free.previous), size)
+
+        self.bottom = None
+        self.num_total -= size
+        self.num_promoted += size
+
+        # the promoted cells were the only young cells old cells could point to
+        self.remembered.clear()
+
+        old = self.old
+        num_used = old.num_total - old.num_free
+
+        if not old.is_scanning() and num_used >= max(self.nursery_size,
+                                                     self.major_growth * old.num_live):
+            old.flip_requested = True
+            old.start_scanning()
+
+        if self.num_total < self.nursery_size:
+            self.expand(self.nursery_size - self.num_total)
+
+    def metrics(self):
+        metrics = super().metrics()
+        metrics['promoted_cells'] = self.num_promoted
+        metrics['old'] = self.old.metrics()
+
+        return metrics
@@ -0,0 +1,154 @@
+import random
+
+from treadmill.generational import GenerationalHeap
+
+
+def get_roots_fn(roots):
+    return lambda: roots
+
+
+def get_children(cell):
+    return cell.value or ()
+
+
+def test_survivors_are_promoted():
+    live = []
+
+    heap = GenerationalHeap(get_roots_fn(live), get_children,
+                            initial_size=10,
+                            scan_step_size=10)
+
+    live.append(heap.allocate())
+
+    while heap.stats.cycles_completed == 0:
+        heap.allocate()
+
+    assert live[0].old
+    assert heap.num_promoted == heap.old.num_total - 1
+    assert heap.num_total == 10
+    assert heap.bottom is None or not heap.bottom.old
+
+
+def test_minor_cycle_does_not_trace_old_cells():
+    live = []
+    scanned = []
+
+    def get_children_logged(cell):
+        scanned.append(cell)
+        return get_children(cell)
+
+    heap = GenerationalHeap(get_roots_fn(live), get_children_logged,
+                            initial_size=10,
+                            scan_step_size=10)
+
+    live.append(heap.allocate())
+
+    while heap.stats.cycles_completed == 0:
+        heap.allocate()
+
+    old = live[0]
+    young = heap.allocate()
+    heap.write(young, [old])
+    live.append(young)
+
+    del scanned[:]
+
+    heap.start_scanning()
+    heap.scan_cycle(100)
+
+    assert young in scanned
+    assert old not in scanned
+
+
+def test_write_remembers_old_cell_with_young_child():
+    live = []
+
+    heap = GenerationalHeap(get_roots_fn(live), get_children,
+                            initial_size=10,
+                            scan_step_size=10)
+
+    live.append(heap.allocate())
+
+    while heap.stats.cycles_completed == 0:
+        heap.allocate()
+
+    old = live[0]
+    young = heap.allocate()
+    heap.write(young, None)
+
+    heap.write(old, [])
+    assert heap.remembered == set()
+
+    heap.write(old, [young])
+    assert heap.remembered == {old}
+
+    # the young cell is only reachable from the old cell
+    while heap.stats.cycles_completed == 1:
+        heap.allocate()
+
+    assert young.old
+    assert heap.remembered == set()
+
+
+def test_major_cycle_releases_old_garbage():
+    live = []
+
+    heap = GenerationalHeap(get_roots_fn(live), get_children,
+                            initial_size=10,
+                            scan_step_size=10,
+                            major_growth=1.5)
+
+    # every cell survives one minor cycle and is dropped later
+    for _ in range(500):
+        live.append(heap.allocate())
+        heap.write(live[-1], None)
+
+        if len(live) > 20:
+            live.pop(0)
+
+    assert heap.old.stats.cycles_completed > 0
+    assert heap.old.stats.released_cells > 0
+    assert heap.old.num_total < heap.num_promoted
+
+
+def test_never_returns_reachable_cell():
+    for seed in range(3):
+        live = []
+
+        heap = GenerationalHeap(get_roots_fn(live), get_children,
+                                initial_size=20,
+                                major_growth=1.5)
+
+        rng = random.Random(seed)
+
+        def reachable():
+            cells = set()
+            stack = list(live)
+
+            while stack:
+                cell = stack.pop()
+
+                if cell not in cells:
+                    cells.add(cell)
+                    stack.extend(cell.value or ())
+
+            return cells
+
+        for _ in range(2000):
+            cells = reachable()
+            cell = heap.allocate()
+
+            assert cell not in cells
+
+            heap.write(cell, None)
+
+            # link some of the cells to a reachable one, which is often old
+            if live and rng.random() < 0.5:
+                heap.write(rng.choice(sorted(cells, key=id)), [cell])
+            else:
+                live.append(cell)
+
+            if len(live) > 50:
+                live.pop(rng.randrange(len(live)))
+
+        assert heap.old.stats.cycles_completed > 0
@@ -1,25 +1,49 @@
 import logging
+import sys
+import time
+import weakref
+from collections import deque
 from typing import Callable, Iterable
 
-from treadmill.list import remove, insert_after, initialize, insert_before
+from treadmill.list import move_after, splice
 from treadmill.cell import Cell
+from treadmill.pacing import Pacer
+from treadmill.roots import RootSet
+from treadmill.shrink import ShrinkPolicy
+from treadmill.stats import HeapStats, record_pauses
+from treadmill.trace import Tracer, LoggingTracer, instrument
+from treadmill.weak import WeakCell
 
 GetRootsFn = Callable[[], Iterable[Cell]]
 GetChildrenFn = Callable[[Cell], Iterable[Cell]]
 
 log = logging.getLogger('episcopal')
 
+# units of scan work done between reading the clock in time-budgeted mode
+TIME_CHECK_INTERVAL = 32
+
+# the scan pointer while roots are marked incrementally, before any cell is
+# scanned
+SCANNING_ROOTS = object()
+
 
 def create_free_cells(size):
     """
     Creates a list containing the specified number of free cells. Returns the
     first cell.
     """
-    first = Cell()
-    initialize(first)
+    cells = [Cell() for _ in range(size)]
+
+    # link the whole chunk at once, without going through the list functions
+    for previous, cell in zip(cells, cells[1:]):
+        previous.next = cell
+        cell.previous = previous
 
-    for _ in range(size - 1):
-        insert_before(Cell(), first)
+    first = cells[0]
+    last = cells[-1]
+
+    first.previous = last
+    last.next = first
 
     return first
 
@@ -31,12 +55,36 @@ class Heap:
                  initial_size: int = 30,
                  scan_step_size: int = 5,
                  expand_size: int = 10,
-                 scan_threshold: float = 0.2):
+                 growth_factor: float = None,
+                 max_expand_size: int = None,
+                 scan_threshold: float = 0.2,
+                 tracer: Tracer = None,
+                 shrink_policy: ShrinkPolicy = None,
+                 pacer: Pacer = None,
+                 stats: HeapStats = None,
+                 scan_budget: int = None,
+                 scan_time_budget: float = None,
+                 root_step_size: int = None,
+                 barrier: str = 'read'):
         self.get_roots = get_roots
         self.get_children = get_children
+        self.initial_size = initial_size
         self.scan_step_size = scan_step_size
         self.expand_size = expand_size
+        self.growth_factor = growth_factor
+        self.max_expand_size = max_expand_size
         self.scan_threshold = scan_threshold
+        self.shrink_policy = shrink_policy
+        self.pacer = pacer
+        self.scan_budget = scan_budget
+        self.scan_time_budget = scan_time_budget
+        self.root_step_size = root_step_size
+
+        if shrink_policy is not None and shrink_policy.shrink_to <= scan_threshold:
+            raise ValueError('Shrinking below scan_threshold would start scanning right away')
+
+        if barrier not in ('read', 'write'):
+            raise ValueError("Expected barrier to be 'read' or 'write'")
 
         self.live_mark = True
 
@@ -44,27 +92,69 @@ class Heap:
         self.num_free = initial_size
         self.num_total = initial_size
         self.num_scanned = 0
+        # number of cells allocated since scanning last started
+        self.num_allocated = 0
+        self.stats = stats if stats is not None else HeapStats()
 
-        self.free = create_free_cells(initial_size)
+        self.free = self.create_free_cells(initial_size)
         self.top = self.bottom = self.scan = None
+        # children of the scan cell that are left to mark in budgeted mode
+        self.scan_children = None
+        # roots that are left to mark, and the free cell at the flip, which
+        # is the first cell allocated after it
+        self.remaining_roots = None
+        self.flip_free = None
+
+        # finalizers by cell, weak cells, and the finalizers of dead cells
+        # with their values, which wait for run_finalizers
+        self.finalizers = {}
+        self.weak_cells = weakref.WeakSet()
+        self.pending_finalizers = deque()
+
+        # a root set marks the roots removed while they are being marked
+        if isinstance(get_roots, RootSet):
+            get_roots.heap = self
+
+        # with a budget, allocations scan in units of work instead of whole
+        # cells, so a cell with many children can be scanned across several
+        # allocations
+        if scan_time_budget is not None:
+            self.scan_allocation = self.scan_timed
+        elif scan_budget is not None:
+            self.scan_allocation = self.scan_budgeted
+
+        # with the write barrier, reads are plain and writes mark the cells
+        # they overwrite, which keeps every cell reachable at the flip
+        if barrier == 'write':
+            self.read = self.plain_read
+            self.write = self.barriered_write
+
+        # tracing is selected once here, so heaps without a tracer run the
+        # plain methods
+        if tracer is None and log.isEnabledFor(logging.DEBUG):
+            tracer = LoggingTracer(log)
+
+        self.tracer = tracer
+
+        if tracer is not None:
+            instrument(self, tracer)
+
+        if self.stats.record_pauses:
+            record_pauses(self, self.stats)
+
+    def create_free_cells(self, size):
+        """
+        Creates a list containing the specified number of free cells. Returns
+        the first cell.
+        """
+        return create_free_cells(size)
 
     def allocate(self):
         """
         Allocates a new cell and returns it. Continues or starts scanning if
         needed, or expands the heap if there are no free cells left.
         """
-        log.debug('Allocate')
-
-        # check if we should start scanning
-        if self.needs_collecting() and not self.is_scanning():
-            self.start_scanning()
-
-        # if scanning, scan a few pointers
-        if self.is_scanning():
-            self.scan_cycle()
-
-        if self.is_full():
-            self.expand()
+        self.prepare_allocation()
 
         # mark the cell `free` points to black (i.e. allocated and used)
         cell = self.free
@@ -72,9 +162,13 @@ class Heap:
 
         # update number of free cells
         self.num_free -= 1
+        self.num_allocated += 1
 
-        # mark the cell
+        # mark the cell, and drop the value it had before it was collected,
+        # which the write barrier must not scan
         cell.mark = self.live_mark
+        cell.value = None
+        cell.tag = None
 
         # initialise the bottom pointer
         if self.bottom is None:
@@ -82,25 +176,184 @@ class Heap:
 
         return cell
 
+    def allocate_many(self, n: int):
+        """
+        Allocates n cells and returns them as a list. Does the scanning work
+        owed for n allocations at once and expands the heap at most once.
+        """
+        self.prepare_allocation(n)
+
+        cells = []
+        cell = self.free
+        live_mark = self.live_mark
+
+        # the allocated cells are the n cells following `free`, so only the
+        # `free` pointer needs to move past them
+        for _ in range(n):
+            cell.mark = live_mark
+            cell.value = None
+            cell.tag = None
+            cells.append(cell)
+            cell = cell.next
+
+        self.free = cell
+
+        self.num_free -= n
+        self.num_allocated += n
+
+        if self.bottom is None and cells:
+            self.bottom = cells[0]
+
+        return cells
+
+    def prepare_allocation(self, n: int = 1):
+        """
+        Does the collector work owed for n allocations, i.e. starts or
+        continues scanning, and makes sure there are enough free cells.
+        """
+        # check if we should start scanning
+        if self.needs_collecting() and not self.is_scanning():
+            self.start_scanning()
+
+        # if scanning, scan a few pointers
+        if self.is_scanning():
+            self.scan_allocation(n)
+
+        if self.is_full(n):
+            self.expand(max(self.next_expand_size(), n + 1 - self.num_free))
+
+    def scan_allocation(self, n: int = 1):
+        """
+        Does the scan work owed for n allocations, i.e. n * scan_step_size scan
+        steps. Replaced by scan_budgeted or scan_timed if the heap has a scan
+        budget.
+        """
+        self.scan_cycle(n * self.scan_step_size)
+
+    def scan_budgeted(self, n: int = 1):
+        """
+        Does n * scan_budget units of scan work.
+        """
+        self.scan_work(n * self.scan_budget)
+
+    def scan_timed(self, n: int = 1):
+        """
+        Scans for n * scan_time_budget microseconds, checking the clock every
+        TIME_CHECK_INTERVAL units of work. If the heap also has a scan_budget,
+        stops after n * scan_budget units of work at the latest.
+        """
+        clock = time.perf_counter
+        deadline = clock() + n * self.scan_time_budget / 1e6
+        budget = n * self.scan_budget if self.scan_budget is not None else None
+
+        while self.is_scanning():
+            work = TIME_CHECK_INTERVAL if budget is None else min(budget, TIME_CHECK_INTERVAL)
+            self.scan_work(work)
+
+            if budget is not None:
+                budget -= work
+
+                if budget <= 0:
+                    break
+
+            if clock() >= deadline:
+                break
+
+    def scan_work(self, budget: int):
+        """
+        Scans until n units of work are done, where n = budget. Marking a child
+        to be scanned and finishing a cell cost one unit each. If the budget
+        runs out in the middle of a cell's children, the rest of them are
+        marked by the next call. Returns the unused budget, which is only left
+        if scanning finished.
+        """
+        while budget > 0 and self.is_scanning():
+            if self.scan is SCANNING_ROOTS:
+                # marking a root costs one unit
+                self.scan_roots(budget)
+                return 0
+
+            if self.scan_children is None:
+                self.scan_children = iter(self.children(self.scan))
+
+            for child in self.scan_children:
+                self.mark_to_scan(child)
+                budget -= 1
+
+                if budget == 0:
+                    return 0
+
+            self.scan_children = None
+            self.advance_scan()
+            budget -= 1
+
+        return budget
+
     def read(self, cell):
         """
         Returns the value stored in the cell. Automatically marks the cell as
         live.
         """
-        log.debug('Read %s', cell)
-
-        if self.is_scanning():
-            # if scanning, the cell needs to be grey or black before read
+        # if scanning, the cell needs to be grey or black before read
+        if self.is_scanning() and cell.mark != self.live_mark:
+            self.stats.read_barrier_hits += 1
             self.mark_to_scan(cell)
 
+        if cell.tag is not None:
+            return cell.tag(cell.value)
+
         return cell.value
 
     def write(self, cell, value):
         """
         Writes the value to the cell.
         """
-        log.debug('Write %s to %s', value, cell)
         cell.value = value
+        cell.tag = None
+
+    def write_scalar(self, cell, tag, payload):
+        """
+        Writes an unboxed scalar to the cell. The payload is stored as the
+        value and tag is called with it to box it again on read. The
+        collector does not ask for the children of such cells.
+        """
+        self.write(cell, payload)
+        cell.tag = tag
+
+    def children(self, cell):
+        """
+        Returns the children of the cell, without calling get_children for
+        unboxed scalars.
+        """
+        if cell.tag is not None:
+            return ()
+
+        return self.get_children(cell)
+
+    def plain_read(self, cell):
+        """
+        Returns the value stored in the cell. Used as read with the write
+        barrier.
+        """
+        if cell.tag is not None:
+            return cell.tag(cell.value)
+
+        return cell.value
+
+    def barriered_write(self, cell, value):
+        """
+        Writes the value to the cell. If scanning, first marks the children
+        the cell had to be scanned, so that overwriting them does not hide
+        them from the collector. Used as write with the write barrier.
+        """
+        if self.is_scanning():
+            self.stats.write_barrier_hits += 1
+
+            for child in self.children(cell):
+                self.mark_to_scan(child)
+
+        cell.value = value
+        cell.tag = None
 
     def needs_collecting(self):
         """
@@ -115,38 +368,59 @@ class Heap:
         """
         return self.scan is not None
 
-    def is_full(self):
+    def is_marked(self, cell):
+        """
+        Checks if the cell is grey or black, i.e. marked with the live mark.
+        """
+        return cell.mark == self.live_mark
+
+    def is_full(self, n: int = 1):
         """
-        Checks if there is only one or no free cells.
+        Checks if allocating n cells would leave no free cells. By default
+        checks if there is only one or no free cells.
         """
-        return self.num_free <= 1
+        return self.num_free <= n
 
     def start_scanning(self):
         """
         Starts the scanning process by finind the roots and marking them to be
-        scanned. If there are no roots, all cells are marked as free.
+        scanned. If there are no roots, all cells are marked as free. With a
+        root_step_size, the roots are only found here and marked by the
+        following scan steps.
         """
-        log.debug('Start scanning')
-
         assert self.top is None
         assert self.scan is None
 
         if self.bottom is None:
             # nothing to scan, there are no live cells
-            log.debug('Nothing to scan')
             return
 
+        self.stats.cycles_started += 1
+        self.stats.allocations += self.num_allocated
+        self.stats.scanned_cells += self.num_scanned
+
         self.num_scanned = 0
+        self.num_allocated = 0
         self.live_mark = not self.live_mark
 
+        if self.root_step_size is not None:
+            self.top = self.cell_before(self.free)
+            self.flip_free = self.free
+
+            self.remaining_roots = iter(self.get_roots())
+            self.scan = SCANNING_ROOTS
+
+            if self.pacer is not None:
+                self.pacer.cycle_started(self)
+
+            return
+
         # find the roots
         roots = list(self.get_roots())
 
         if roots:
-            log.debug('Scanning %d roots', len(roots))
-
             # initialise the top pointer and paint all black cells white
-            self.top = self.free.previous
+            self.top = self.cell_before(self.free)
 
             # if there are any roots, mark them to be scanned
             for root in roots:
@@ -154,58 +428,110 @@ class Heap:
 
             self.scan = roots[0]
 
+            if self.pacer is not None:
+                self.pacer.cycle_started(self)
+
         else:
-            log.debug('No roots')
             # there are no roots, so all cells are now free
+            first_garbage = self.bottom
+            num_garbage = self.num_total - self.num_free
+
             self.top = None
             self.bottom = None
             self.num_free = self.num_total
 
-    def scan_cycle(self):
+            self.stats.record_collection(num_garbage)
+            self.finalize()
+            self.shrink(first_garbage, num_garbage)
+
+            if self.pacer is not None:
+                self.pacer.cycle_finished(self)
+
+    def scan_cycle(self, steps: int = None):
         """
-        Executes at most n scan steps, where n = scan_step_size.
+        Executes at most n scan steps, where n = steps or scan_step_size.
         """
-        log.debug('Scan cycle')
+        if steps is None:
+            steps = self.scan_step_size
 
-        for _ in range(self.scan_step_size):
+        for _ in range(steps):
             continue_scan = self.scan_step()
 
             if not continue_scan:
                 break
 
+    def scan_roots(self, steps: int):
+        """
+        Marks at most n of the remaining roots to be scanned, where n = steps.
+        Once all roots are marked, scanning continues with the grey cell
+        marked first. If there is none, only the cells allocated since the
+        flip are live and the garbage is collected. Returns False if scanning
+        finished.
+        """
+        for _ in range(steps):
+            root = next(self.remaining_roots, None)
+
+            if root is None:
+                break
+
+            self.mark_to_scan(root)
+        else:
+            return True
+
+        self.remaining_roots = None
+
+        # grey cells are inserted after top, so the first one is right before
+        # the first cell allocated after the flip
+        first_grey = self.cell_before(self.flip_free)
+        self.flip_free = None
+
+        if self.top is not None and first_grey == self.top:
+            self.scan = None
+            self.collect()
+            return False
+
+        self.scan = first_grey
+        return True
+
     def scan_step(self):
         """
         Scans one cell by marking all its children to be scanned. If scanning
         finishes, collects the garbage. If no garbage is found, restarts
         scanning.
         """
-        log.debug('Scan step %s', self.scan)
-
         assert self.scan is not None
         assert self.bottom is not None
 
+        if self.scan is SCANNING_ROOTS:
+            return self.scan_roots(self.root_step_size)
+
         # mark all children to be scanned
-        for child in self.get_children(self.scan):
+        for child in self.children(self.scan):
             self.mark_to_scan(child)
 
+        return self.advance_scan()
+
+    def advance_scan(self):
+        """
+        Finishes scanning the scan cell, whose children were marked, and moves
+        to the next grey cell. Returns False if scanning finished.
+        """
         self.num_scanned += 1
 
         if self.top is not None and self.scan.previous == self.top:
-            log.debug('Stop and collect garbage')
             # all grey cells were scanned, so we can stop and collect garbage
             self.scan = None
             self.collect()
             return False
 
         elif self.scan == self.bottom:
-            log.debug('No garbage')
             # there are no white cells left, i.e. there is no garbage
             self.scan = None
+            self.stats.empty_cycles += 1
             self.start_scanning()
             return False
 
         else:
-            log.debug('Scanned')
             self.scan = self.scan.previous
             return True
 
@@ -213,32 +539,127 @@ class Heap:
         """
         Collects garbage when scanning is finished.
         """
-        log.debug('Collect')
-
         # assert that there are no grey cells, i.e. scanning is finished
         assert self.scan is None
 
         # assert that there are some white cells, i.e. there is garbage
         assert self.top is not None
 
+        first_garbage = self.bottom
+        num_free = self.num_free
+
         # set the bottom pointer to the last live cell
-        self.bottom = self.top.next
+        self.bottom = self.cell_after(self.top)
         self.top = None
 
-        # update statistics
-        self.num_free = self.num_total - self.num_scanned
+        # update statistics, cells allocated while scanning are live as well
+        self.num_free = self.num_total - self.num_scanned - self.num_allocated
+
+        num_garbage = self.num_free - num_free
+
+        self.stats.record_collection(num_garbage)
+        self.finalize()
+        self.shrink(first_garbage, num_garbage)
+
+        if self.pacer is not None:
+            self.pacer.cycle_finished(self)
+
+    def finalize(self):
+        """
+        Clears the weak cells and queues the finalizers of the cells that the
+        finished cycle found dead. Only the registered cells are checked, so
+        collecting other cells costs nothing more.
+        """
+        if self.weak_cells:
+            for weak in list(self.weak_cells):
+                if not self.is_marked(weak.cell):
+                    weak.cell = None
+                    self.weak_cells.discard(weak)
+
+        if self.finalizers:
+            dead = [cell for cell in self.finalizers if not self.is_marked(cell)]
+
+            # the value is passed to the finalizer, as the cell is free now
+            for cell in dead:
+                self.pending_finalizers.append((self.finalizers.pop(cell), self.plain_read(cell)))
+
+    def register_finalizer(self, cell, callback):
+        """
+        Registers callback to be called with the value of the cell once the
+        cell is found dead. The call is made by run_finalizers, not by the
+        collection itself. Replaces the cell's previous finalizer.
+        """
+        self.finalizers[cell] = callback
+
+    def weak(self, cell):
+        """
+        Returns a weak reference to the cell, which is cleared once the cell
+        is found dead.
+        """
+        weak = WeakCell(self, cell)
+        self.weak_cells.add(weak)
+        return weak
+
+    def run_finalizers(self, max_count: int = None):
+        """
+        Calls at most n queued finalizers, where n = max_count, or all of
+        them. Meant to be called outside of allocation, so that finalizers do
+        not add to allocation pauses. Returns the number of calls.
+        """
+        count = 0
+
+        while self.pending_finalizers and (max_count is None or count < max_count):
+            callback, value = self.pending_finalizers.popleft()
+            callback(value)
+            count += 1
+
+        return count
+
+    def shrink(self, first_garbage, num_garbage: int):
+        """
+        Releases some of the just collected cells if the shrink policy asks
+        for it. The collected cells start with first_garbage and are free.
+        """
+        if self.shrink_policy is None:
+            return
+
+        size = self.shrink_policy.release_size(self, num_garbage)
+
+        if size > 0:
+            self.release(first_garbage, size)
+
+    def release(self, first, size: int):
+        """
+        Removes n free cells from the heap, starting with first, where
+        n = size. The cells are unlinked and cleared, so Python can free them.
+        Returns the cell following the removed ones.
+        """
+        left = first.previous
+        cell = first
+
+        for _ in range(size):
+            following = cell.next
+            cell.previous = cell.next = cell.value = None
+            cell = following
+
+        left.next = cell
+        cell.previous = left
+
+        self.num_total -= size
+        self.num_free -= size
+
+        self.stats.record_release(size, size * self.bytes_per_cell())
+
+        return cell
 
     def mark_to_scan(self, cell):
         """
         Marks cell to be scanned, if it isn't already and if it has not been
         scanned yet.
         """
-        log.debug('Mark to scan %s', cell)
-
         assert self.bottom is not None
 
         if cell.mark == self.live_mark:
-            log.debug('Cell is already grey or black')
             # do nothing if the cell is already grey or black
             return
 
@@ -248,52 +669,102 @@ class Heap:
         cell.mark = self.live_mark
 
         if cell == self.bottom and cell == self.top:
-            log.debug('Marking the only white cell grey')
             # marking the only white cell grey
             # no manipulation needed, just update the top pointer
             self.top = None
         elif cell == self.bottom:
-            log.debug('Marking the last white cell grey')
             # marking the last white cell grey
             # update the bottom pointer to the next white cell
             self.bottom = cell.next
 
             # remove the cell from whites and add it to greys
-            remove(cell)
-            insert_after(cell, self.top)
+            move_after(cell, self.top)
         elif cell == self.top:
-            log.debug('Marking the first white cell grey')
             # marking the first white cell grey
             # no manipulation needed, just update the top pointer
             self.top = cell.previous
         else:
-            log.debug('Cell is neither the first or last white cell')
             # cell is neither the first or last white cell
             # move the cell from whites to greys
-            remove(cell)
-            insert_after(cell, self.top)
+            move_after(cell, self.top)
 
-    def expand(self):
+    def next_expand_size(self):
         """
-        Creates n free cells and adds them to the heap, where n = expand_size.
+        Returns the number of cells the next expansion adds. Without a growth
+        factor this is expand_size. With a growth factor the heap grows by
+        that factor, adding at least expand_size and at most max_expand_size
+        cells.
         """
-        log.debug('Expand')
+        if self.growth_factor is None:
+            return self.expand_size
+
+        size = max(self.expand_size, int(self.num_total * (self.growth_factor - 1)))
 
-        first_extra = create_free_cells(self.expand_size)
-        last_extra = first_extra.previous
+        if self.max_expand_size is not None:
+            size = min(size, self.max_expand_size)
+
+        return size
+
+    def reserve(self, size: int):
+        """
+        Expands the heap in one chunk, so that it has at least n cells in
+        total, where n = size.
+        """
+        if size > self.num_total:
+            self.expand(size - self.num_total)
+
+    def expand(self, size: int = None):
+        """
+        Creates n free cells and adds them to the heap, where n = size or the
+        next expansion size.
+        """
+        if size is None:
+            size = self.next_expand_size()
 
         # insert the new cells into the list, after the current free cell
-        left = self.free
-        right = left.next
+        splice(self.create_free_cells(size), self.free)
 
-        left.next = first_extra
-        first_extra.previous = left
+        self.num_total += size
+        self.num_free += size
 
-        right.previous = last_extra
-        last_extra.next = right
+        self.stats.record_expansion(size)
 
-        self.num_total += self.expand_size
-        self.num_free += self.expand_size
+    def bytes_per_cell(self):
+        """
+        Returns the number of bytes used by one cell, not counting its value.
+        """
+        cell = Cell()
+        return sys.getsizeof(cell) + sys.getsizeof(vars(cell))
+
+    def cell_before(self, cell):
+        """
+        Returns the cell preceding the passed cell in the treadmill.
+        """
+        return cell.previous
+
+    def cell_after(self, cell):
+        """
+        Returns the cell following the passed cell in the treadmill.
+        """
+        return cell.next
+
+    def metrics(self):
+        """
+        Returns the statistics and the current state of the heap as a
+        dictionary.
+        """
+        metrics = self.stats.snapshot()
+        metrics['allocations'] += self.num_allocated
+        metrics['scanned_cells'] += self.num_scanned
+
+        metrics.update({
+            'num_free': self.num_free,
+            'num_total': self.num_total,
+            'num_scanned': self.num_scanned,
+            'scanning': self.is_scanning(),
+        })
+
+        return metrics
 
     def string(self):
         """
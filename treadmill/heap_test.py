@@ -1,3 +1,7 @@
+import random
+
+import pytest
+
 from treadmill.heap import create_free_cells, Heap
 from treadmill.list import iterate
 
@@ -485,4 +489,426 @@ def test_expand():
 
     assert len(cells) == 15
     assert heap.free == cells[4]
-    assert heap.bottom == cells[0]
\ No newline at end of file
+    assert heap.bottom == cells[0]
+
+def test_collect_counts_cells_allocated_while_scanning():
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=5)
+
+    cells = list(heap.free)
+
+    # cell 4 is free, 3 was allocated while scanning, 2 is live, 0-1 are garbage
+    heap.free = cells[4]
+    heap.bottom = cells[0]
+    heap.top = cells[1]
+
+    heap.num_free = 1
+    heap.num_scanned = 1
+    heap.num_allocated = 1
+
+    heap.collect()
+
+    assert heap.num_free == 3
+
+
+def test_allocate_many():
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=10)
+
+    cells = list(heap.free)
+    allocated = heap.allocate_many(4)
+
+    assert allocated == cells[0:4]
+    assert heap.free == cells[4]
+    assert heap.bottom == cells[0]
+    assert heap.num_free == 6
+    assert all(cell.mark == heap.live_mark for cell in allocated)
+
+
+def test_allocate_many_expands_once():
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=5,
+                scan_threshold=0,
+                expand_size=10)
+
+    allocated = heap.allocate_many(30)
+
+    assert len(set(allocated)) == 30
+    assert heap.num_total == 31
+    assert heap.num_free == 1
+    assert heap.free not in allocated
+
+
+def test_allocate_many_scans_for_each_cell():
+    def get_roots():
+        return cells[0:8]
+
+    heap = Heap(get_roots=get_roots,
+                get_children=dummy_get_children,
+                initial_size=20,
+                scan_threshold=0.5,
+                scan_step_size=1)
+
+    cells = heap.allocate_many(10)
+    heap.allocate_many(3)
+
+    assert heap.num_scanned == 3
+
+
+def test_release():
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=6)
+
+    cells = list(heap.free)
+
+    # cells 4-5 are free, 2-3 are live, 0-1 were just collected
+    heap.free = cells[4]
+    heap.bottom = cells[2]
+    heap.num_free = 4
+
+    heap.release(cells[0], 2)
+
+    assert list(heap.bottom) == cells[2:]
+    assert heap.num_free == 2
+    assert heap.num_total == 4
+    assert heap.stats.released_cells == 2
+    assert cells[0].next is None
+
+
+def test_create_free_cells_links_both_ways():
+    first = create_free_cells(5)
+    cells = list(iterate(first))
+
+    assert [cell.previous for cell in cells] == cells[-1:] + cells[:-1]
+
+
+def test_next_expand_size_is_fixed_by_default():
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=100,
+                expand_size=10)
+
+    assert heap.next_expand_size() == 10
+
+
+def test_next_expand_size_grows_geometrically():
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=100,
+                expand_size=10,
+                growth_factor=1.5,
+                max_expand_size=200)
+
+    assert heap.next_expand_size() == 50
+
+    heap.num_total = 10
+    assert heap.next_expand_size() == 10
+
+    heap.num_total = 1000
+    assert heap.next_expand_size() == 200
+
+
+def test_allocate_expands_geometrically():
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=10,
+                scan_threshold=0,
+                expand_size=10,
+                growth_factor=2)
+
+    for _ in range(100):
+        heap.allocate()
+
+    assert heap.num_total == 160
+    assert len(list(heap.free)) == 160
+
+
+def test_reserve():
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=10)
+
+    heap.reserve(1000)
+
+    assert heap.num_total == 1000
+    assert heap.num_free == 1000
+
+    heap.reserve(500)
+
+    assert heap.num_total == 1000
+
+
+def test_scan_work_splits_children():
+    def get_roots():
+        return cells[0:1]
+
+    def get_children(cell):
+        return cell.value or ()
+
+    heap = Heap(get_roots=get_roots,
+                get_children=get_children,
+                initial_size=40)
+
+    cells = [heap.allocate() for _ in range(25)]
+    heap.write(cells[0], cells[1:21])
+
+    heap.start_scanning()
+
+    assert heap.scan_work(8) == 0
+    assert heap.scan == cells[0]
+    assert [heap.is_marked(cell) for cell in cells[1:21]] == [True] * 8 + [False] * 12
+
+    # 12 remaining children and finishing the root
+    heap.scan_work(13)
+
+    assert heap.scan == cells[1]
+    assert heap.scan_children is None
+    assert all(heap.is_marked(cell) for cell in cells[1:21])
+
+
+def test_scan_work_returns_unused_budget():
+    def get_roots():
+        return cells[0:1]
+
+    heap = Heap(get_roots=get_roots,
+                get_children=dummy_get_children,
+                initial_size=10)
+
+    cells = [heap.allocate() for _ in range(5)]
+    heap.start_scanning()
+
+    assert heap.scan_work(10) == 9
+    assert not heap.is_scanning()
+    assert heap.num_free == 9
+
+
+def test_budgeted_heap_never_returns_live_cell():
+    for kwargs in ({'scan_budget': 16}, {'scan_time_budget': 5}):
+        live = []
+
+        def get_children(cell):
+            return cell.value or ()
+
+        heap = Heap(get_roots=lambda: live[:1],
+                    get_children=get_children,
+                    initial_size=10,
+                    **kwargs)
+
+        root = heap.allocate()
+        live.append(root)
+
+        for i in range(2000):
+            cell = heap.allocate()
+            assert cell not in live
+
+            # the root holds a growing, large number of children
+            if i % 3 == 0:
+                heap.write(root, list(heap.read(root) or ()) + [cell])
+                live.append(cell)
+
+        assert len(set(live)) == len(live)
+
+
+def test_write_barrier_marks_overwritten_children():
+    def get_roots():
+        return cells[0:1]
+
+    def get_children(cell):
+        return cell.value or ()
+
+    heap = Heap(get_roots=get_roots,
+                get_children=get_children,
+                initial_size=10,
+                barrier='write')
+
+    cells = [heap.allocate() for _ in range(3)]
+    heap.write(cells[0], [cells[1]])
+    heap.write(cells[2], None)
+
+    heap.start_scanning()
+
+    # reads do not mark cells
+    assert heap.read(cells[2]) is None
+    assert not heap.is_marked(cells[2])
+
+    heap.write(cells[0], [cells[2]])
+
+    assert heap.is_marked(cells[1])
+    assert heap.stats.write_barrier_hits == 1
+
+
+def test_write_barrier_never_returns_live_cell():
+    live = []
+
+    def get_children(cell):
+        return cell.value or ()
+
+    heap = Heap(get_roots=lambda: live,
+                get_children=get_children,
+                barrier='write')
+
+    rng = random.Random(0)
+
+    def reachable():
+        cells = set()
+        stack = list(live)
+
+        while stack:
+            cell = stack.pop()
+
+            if cell not in cells:
+                cells.add(cell)
+                stack.extend(cell.value or ())
+
+        return cells
+
+    for _ in range(2000):
+        cells = reachable()
+        cell = heap.allocate()
+
+        assert cell not in cells
+
+        heap.write(cell, None)
+
+        # move a reachable cell under the new one, cutting its old link
+        if live and rng.random() < 0.5:
+            parent = rng.choice(live)
+            child = heap.read(parent)
+
+            heap.write(parent, [cell])
+            heap.write(cell, child)
+        else:
+            live.append(cell)
+
+        if len(live) > 50:
+            live.pop(rng.randrange(len(live)))
+
+
+def test_barrier_must_be_read_or_write():
+    with pytest.raises(ValueError):
+        Heap(get_roots=dummy_get_roots,
+             get_children=dummy_get_children,
+             barrier='none')
+
+
+def test_write_scalar_is_boxed_on_read():
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=2)
+
+    cell = heap.allocate()
+    heap.write_scalar(cell, str, 123)
+
+    assert cell.value == 123
+    assert heap.read(cell) == '123'
+
+    heap.write(cell, 456)
+
+    assert heap.read(cell) == 456
+
+
+def test_scanning_skips_unboxed_scalars():
+    live = []
+
+    def get_children(cell):
+        assert cell.tag is None
+        return cell.value
+
+    heap = Heap(get_roots=lambda: live,
+                get_children=get_children,
+                initial_size=10)
+
+    for i in range(200):
+        cell = heap.allocate()
+
+        if i % 2:
+            heap.write_scalar(cell, int, i)
+        else:
+            heap.write(cell, live[-1:])
+
+        live.append(cell)
+
+        if len(live) > 20:
+            live.pop(0)
+
+    assert heap.stats.cycles_completed > 0
+
+
+def test_finalizers_run_outside_allocation():
+    live = []
+    finalized = []
+
+    heap = Heap(get_roots=lambda: live,
+                get_children=dummy_get_children,
+                initial_size=10)
+
+    kept = heap.allocate()
+    dropped = heap.allocate()
+    live.extend([kept, dropped])
+
+    heap.write(kept, 'kept')
+    heap.write(dropped, 'dropped')
+    heap.register_finalizer(kept, finalized.append)
+    heap.register_finalizer(dropped, finalized.append)
+
+    live.remove(dropped)
+
+    while heap.stats.cycles_completed < 2:
+        heap.allocate()
+
+    assert finalized == []
+    assert heap.run_finalizers() == 1
+    assert finalized == ['dropped']
+    assert list(heap.finalizers) == [kept]
+
+
+def test_weak_cell_is_cleared():
+    live = []
+
+    heap = Heap(get_roots=lambda: live,
+                get_children=dummy_get_children,
+                initial_size=10)
+
+    kept = heap.allocate()
+    dropped = heap.allocate()
+    live.extend([kept, dropped])
+
+    weak_kept = heap.weak(kept)
+    weak_dropped = heap.weak(dropped)
+
+    live.remove(dropped)
+
+    while heap.stats.cycles_completed < 2:
+        heap.allocate()
+
+    assert weak_kept.get() is kept
+    assert weak_dropped.get() is None
+
+
+def test_weak_cell_get_while_scanning_keeps_cell():
+    live = []
+
+    heap = Heap(get_roots=lambda: live,
+                get_children=dummy_get_children,
+                initial_size=10)
+
+    live.append(heap.allocate())
+    cell = heap.allocate()
+    weak = heap.weak(cell)
+
+    # garbage, so that the cycle finishes
+    heap.allocate()
+    heap.start_scanning()
+
+    # the mutator takes the cell back before the collector finds it dead
+    live.append(weak.get())
+
+    while heap.is_scanning():
+        heap.scan_step()
+
+    assert weak.get() is cell
+    assert heap.is_marked(cell)
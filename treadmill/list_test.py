@@ -1,5 +1,6 @@
 from treadmill import Cell
-from treadmill.list import initialize, insert_after, iterate, insert_between, remove
+from treadmill.heap import create_free_cells
+from treadmill.list import initialize, insert_after, iterate, insert_between, remove, move_after, splice, cut, move
 
 
 def test_initialize():
@@ -80,4 +81,45 @@ def test_remove_three():
     remove(cell2)
 
     assert cell1.next == cell3
-    assert cell3.previous == cell1
\ No newline at end of file
+    assert cell3.previous == cell1
+
+def assert_linked(cells):
+    """
+    Asserts that the cells form one list in the passed order.
+    """
+    assert list(iterate(cells[0])) == cells
+    assert [cell.previous for cell in cells] == cells[-1:] + cells[:-1]
+
+
+def test_move_after():
+    cells = list(iterate(create_free_cells(4)))
+
+    move_after(cells[0], cells[2])
+
+    assert_linked([cells[1], cells[2], cells[0], cells[3]])
+
+
+def test_splice():
+    cells = list(iterate(create_free_cells(3)))
+    others = list(iterate(create_free_cells(2)))
+
+    splice(others[0], cells[0])
+
+    assert_linked([cells[0], others[0], others[1], cells[1], cells[2]])
+
+
+def test_cut():
+    cells = list(iterate(create_free_cells(5)))
+
+    first = cut(cells[1], cells[3])
+
+    assert_linked([cells[0], cells[4]])
+    assert_linked([first, cells[2], cells[3]])
+
+
+def test_move():
+    cells = list(iterate(create_free_cells(5)))
+
+    move(cells[0], cells[1], cells[3])
+
+    assert_linked([cells[2], cells[3], cells[0], cells[1], cells[4]])
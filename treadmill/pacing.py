@@ -0,0 +1,103 @@
+import math
+
+
+class Pacer:
+    """
+    Adjusts scan_step_size and scan_threshold of a heap, so that each scanning
+    cycle finishes before the free cells run out, while doing as little scan
+    work per allocation as possible.
+
+    When a cycle starts, the scan step size is set so that the estimated live
+    cells are scanned within the free cells that are left. When a cycle
+    finishes, the scan threshold is set so that the next cycle starts with
+    enough free cells to scan the live cells at `target_step` cells per
+    allocation. If there are not enough free cells, the heap is expanded, but
+    only up to (1 + max_growth) times the live cells, similar to the heap goal
+    of Go's pacer. `headroom` pads the estimates, and grows when a cycle had
+    to expand the heap, and shrinks back when cycles finish without it.
+    """
+
+    def __init__(self,
+                 target_step: int = 2,
+                 min_step: int = 1,
+                 max_step: int = 50,
+                 max_growth: float = 1.0,
+                 headroom: float = 0.1,
+                 max_headroom: float = 2.0,
+                 min_threshold: float = 0.05,
+                 max_threshold: float = 0.9):
+        self.target_step = target_step
+        self.min_step = min_step
+        self.max_step = max_step
+        self.max_growth = max_growth
+        self.min_headroom = headroom
+        self.max_headroom = max_headroom
+        self.headroom = headroom
+        self.min_threshold = min_threshold
+        self.max_threshold = max_threshold
+
+        # number of live cells found by the last cycle
+        self.num_live = None
+        # number of cells when the current cycle started
+        self.num_total_at_start = None
+
+    def cycle_started(self, heap):
+        """
+        Called when the heap starts scanning. Sets the scan step size.
+        """
+        if self.num_total_at_start is not None:
+            # the last cycle found no garbage and the heap restarted scanning,
+            # so all allocated cells were live and the heap needs to grow
+            self.num_live = heap.num_total - heap.num_free
+            self.reserve(heap)
+
+        # the cells found live by the last cycle are the estimate of cells to
+        # scan, before the first cycle all allocated cells are counted
+        if self.num_live is None:
+            estimate = heap.num_total - heap.num_free
+        else:
+            estimate = self.num_live
+
+        work = estimate * (1 + self.headroom)
+        runway = max(heap.num_free - 1, 1)
+
+        step = int(math.ceil(work / runway))
+        heap.scan_step_size = max(self.min_step, min(self.max_step, step))
+
+        self.num_total_at_start = heap.num_total
+
+    def cycle_finished(self, heap):
+        """
+        Called when the heap collects garbage. Sets the scan threshold for the
+        next cycle.
+        """
+        self.num_live = heap.num_total - heap.num_free
+
+        expanded = self.num_total_at_start is not None and heap.num_total > self.num_total_at_start
+        self.num_total_at_start = None
+
+        if expanded:
+            self.headroom = min(self.max_headroom, self.headroom * 2)
+        else:
+            self.headroom = max(self.min_headroom, self.headroom / 2)
+
+        threshold = self.reserve(heap) / heap.num_total
+
+        heap.scan_threshold = max(self.min_threshold, min(self.max_threshold, threshold))
+
+    def reserve(self, heap):
+        """
+        Expands the heap if it has fewer free cells than needed to scan the
+        live cells at `target_step` cells per allocation, without growing past
+        the heap goal. Returns the number of needed free cells.
+        """
+        needed = int(math.ceil(self.num_live * (1 + self.headroom) / self.target_step)) + 1
+
+        if heap.num_free < needed:
+            goal = int(self.num_live * (1 + self.max_growth))
+            size = min(needed - heap.num_free, goal - heap.num_total)
+
+            if size > 0:
+                heap.expand(size)
+
+        return needed
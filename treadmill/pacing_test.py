@@ -0,0 +1,108 @@
+from treadmill.heap import Heap
+from treadmill.pacing import Pacer
+
+
+def dummy_get_children(obj):
+    return ()
+
+
+def create_heap(roots, pacer, initial_size=100):
+    return Heap(get_roots=lambda: roots,
+                get_children=dummy_get_children,
+                initial_size=initial_size,
+                pacer=pacer)
+
+
+def test_cycle_started_sets_step_size():
+    pacer = Pacer(headroom=0.1)
+    heap = create_heap([], pacer)
+
+    # 80 cells allocated, 20 free
+    heap.num_free = 20
+
+    pacer.cycle_started(heap)
+
+    # 80 * 1.1 cells need to be scanned within 19 allocations
+    assert heap.scan_step_size == 5
+
+
+def test_cycle_started_limits_step_size():
+    pacer = Pacer(max_step=10)
+    heap = create_heap([], pacer)
+
+    heap.num_free = 2
+    pacer.cycle_started(heap)
+
+    assert heap.scan_step_size == 10
+
+
+def test_cycle_finished_sets_threshold():
+    pacer = Pacer(target_step=2, headroom=0.1)
+    heap = create_heap([], pacer)
+
+    # 40 live cells, 60 free
+    heap.num_free = 60
+
+    pacer.cycle_started(heap)
+    pacer.cycle_finished(heap)
+
+    # 40 * 1.1 / 2 + 1 cells are needed when scanning starts
+    assert heap.scan_threshold == 0.23
+    assert heap.num_total == 100
+
+
+def test_cycle_finished_expands_up_to_goal():
+    pacer = Pacer(target_step=1, headroom=0.1, max_growth=0.5)
+    heap = create_heap([], pacer)
+
+    # 80 live cells, 20 free
+    heap.num_free = 20
+
+    pacer.cycle_started(heap)
+    pacer.cycle_finished(heap)
+
+    assert heap.num_total == 120
+    assert heap.num_free == 40
+
+
+def test_cycle_finished_increases_headroom_after_expanding():
+    pacer = Pacer(headroom=0.1)
+    heap = create_heap([], pacer)
+
+    heap.num_free = 50
+
+    pacer.cycle_started(heap)
+    heap.expand(10)
+    pacer.cycle_finished(heap)
+
+    assert pacer.headroom == 0.2
+
+
+def test_restart_grows_heap():
+    pacer = Pacer(target_step=1, headroom=0.1, max_growth=2)
+    heap = create_heap([], pacer)
+
+    heap.num_free = 50
+
+    pacer.cycle_started(heap)
+    pacer.cycle_started(heap)
+
+    # all 50 allocated cells were live
+    assert pacer.num_live == 50
+    # enough free cells to scan them at one cell per allocation
+    assert heap.num_total > 100
+    assert heap.num_free >= 50 * 1.1 + 1
+
+
+def test_never_returns_live_cell():
+    live = []
+    heap = create_heap(live, Pacer(), initial_size=30)
+
+    for _ in range(3000):
+        cell = heap.allocate()
+        assert cell not in live
+
+        live.append(cell)
+
+        if len(live) > 100:
+            live.pop(0)
@@ -0,0 +1,86 @@
+class RootSet:
+    """
+    A set of roots that can be marked a few at a time. Pass it as get_roots
+    of a heap with a root_step_size.
+
+    Roots are kept in slots, which do not move when other roots are removed,
+    so the roots can be iterated while they change. A root removed before
+    the heap reached its slot is marked right away, like a deletion barrier,
+    as the mutator may still hold it. A root added behind the heap does not
+    need to be marked, it is either a new cell, which is live, or was read
+    from the heap or another root, so it is already marked.
+    """
+
+    def __init__(self):
+        self.cells = []
+        self.free_slots = []
+        # set by the heap using the root set
+        self.heap = None
+        # next slot to mark, or None if the roots are not being marked
+        self.position = None
+
+    def __call__(self):
+        return self.iterate()
+
+    def __len__(self):
+        return len(self.cells) - len(self.free_slots)
+
+    def __iter__(self):
+        return (cell for cell in self.cells if cell is not None)
+
+    def add(self, cell) -> int:
+        """
+        Adds a root and returns its slot.
+        """
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.cells[slot] = cell
+        else:
+            slot = len(self.cells)
+            self.cells.append(cell)
+
+        return slot
+
+    def remove(self, slot: int):
+        """
+        Removes the root in the slot and returns it.
+        """
+        cell = self.cells[slot]
+        self.cells[slot] = None
+        self.free_slots.append(slot)
+
+        self.removed(slot, cell)
+
+        return cell
+
+    def replace(self, slot: int, cell):
+        """
+        Puts another root in the slot and returns the replaced root.
+        """
+        replaced = self.cells[slot]
+        self.cells[slot] = cell
+
+        self.removed(slot, replaced)
+
+        return replaced
+
+    def removed(self, slot: int, cell):
+        if cell is not None and self.position is not None and slot >= self.position:
+            self.heap.mark_to_scan(cell)
+
+    def iterate(self):
+        """
+        Yields the roots for the heap to mark, keeping track of the position.
+        """
+        cells = self.cells
+        self.position = 0
+
+        try:
+            while self.position < len(cells):
+                cell = cells[self.position]
+                self.position += 1
+
+                if cell is not None:
+                    yield cell
+        finally:
+            self.position = None
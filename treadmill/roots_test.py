@@ -0,0 +1,155 @@
+import random
+import time
+
+from treadmill.heap import Heap
+from treadmill.roots import RootSet
+
+
+def dummy_get_children(obj):
+    return ()
+
+
+def test_add_reuses_removed_slots():
+    roots = RootSet()
+
+    assert roots.add('a') == 0
+    assert roots.add('b') == 1
+
+    assert roots.remove(0) == 'a'
+    assert roots.add('c') == 0
+
+    assert list(roots) == ['c', 'b']
+    assert len(roots) == 2
+
+
+def test_roots_are_marked_incrementally():
+    roots = RootSet()
+
+    heap = Heap(get_roots=roots,
+                get_children=dummy_get_children,
+                initial_size=20,
+                root_step_size=2)
+
+    cells = [heap.allocate() for _ in range(10)]
+
+    for cell in cells[:6]:
+        roots.add(cell)
+
+    heap.start_scanning()
+
+    assert not any(heap.is_marked(cell) for cell in cells)
+
+    heap.scan_step()
+
+    assert [heap.is_marked(cell) for cell in cells[:6]] == [True] * 2 + [False] * 4
+
+
+def test_removed_root_is_marked():
+    roots = RootSet()
+
+    heap = Heap(get_roots=roots,
+                get_children=dummy_get_children,
+                initial_size=20,
+                root_step_size=1)
+
+    cells = [heap.allocate() for _ in range(4)]
+    slots = [roots.add(cell) for cell in cells]
+
+    heap.start_scanning()
+    heap.scan_step()
+
+    # the mutator still holds the removed root
+    roots.remove(slots[3])
+
+    assert heap.is_marked(cells[3])
+    assert not heap.is_marked(cells[2])
+
+    heap.scan_cycle(100)
+
+    assert heap.num_free == 16
+
+
+def test_no_roots_collects_all_but_new_cells():
+    heap = Heap(get_roots=RootSet(),
+                get_children=dummy_get_children,
+                initial_size=20,
+                root_step_size=1)
+
+    for _ in range(10):
+        heap.allocate()
+
+    heap.start_scanning()
+    cell = heap.allocate()
+
+    assert not heap.is_scanning()
+    assert heap.num_free == 19
+    assert heap.bottom == cell
+
+
+def test_never_returns_live_cell():
+    roots = RootSet()
+    live = {}
+
+    def get_children(cell):
+        child = heap.read(cell)
+        return (child,) if child is not None else ()
+
+    heap = Heap(get_roots=roots,
+                get_children=get_children,
+                root_step_size=3)
+
+    rng = random.Random(0)
+
+    for _ in range(5000):
+        cell = heap.allocate()
+        heap.write(cell, None)
+
+        assert cell not in live.values()
+
+        # link some of the cells to a live one, so they are only reachable as children
+        if live and rng.random() < 0.3:
+            heap.write(rng.choice(list(live.values())), cell)
+        else:
+            live[roots.add(cell)] = cell
+
+        if len(live) > 100:
+            slot = rng.choice(list(live))
+            roots.remove(slot)
+            del live[slot]
+
+
+def max_allocation_pause(num_roots, root_step_size):
+    roots = RootSet()
+
+    heap = Heap(get_roots=roots,
+                get_children=dummy_get_children,
+                initial_size=2 * num_roots,
+                scan_threshold=0.5,
+                root_step_size=root_step_size)
+
+    for _ in range(num_roots):
+        roots.add(heap.allocate())
+
+    assert not heap.is_scanning()
+
+    pauses = []
+
+    # the first allocation flips, allocate until the cycle is done
+    while heap.stats.cycles_completed == 0:
+        start = time.perf_counter()
+        heap.allocate()
+        pauses.append(time.perf_counter() - start)
+
+    return max(pauses)
+
+
+def test_worst_case_pause_does_not_grow_with_roots():
+    eager = max_allocation_pause(100000, None)
+    incremental_small = max_allocation_pause(1000, 2)
+    incremental_large = max_allocation_pause(100000, 2)
+
+    # marking 100000 roots at the flip takes tens of milliseconds, while
+    # incremental marking keeps every allocation short regardless of the
+    # number of roots
+    assert incremental_large < eager / 5
+    assert incremental_large < incremental_small + eager / 5
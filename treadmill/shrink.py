@@ -0,0 +1,62 @@
+class ShrinkPolicy:
+    """
+    Decides how many free cells a heap releases after garbage is collected.
+
+    The heap shrinks once the ratio of free and all cells stays above
+    `shrink_above` for `delay` collections in a row, and then releases enough
+    free cells to bring the ratio down to the low-water mark `shrink_to`. The
+    gap between the two ratios, and between `shrink_to` and the heap's
+    `scan_threshold`, keeps the heap from alternating between expanding and
+    shrinking.
+    """
+
+    def __init__(self,
+                 shrink_above: float = 0.6,
+                 shrink_to: float = 0.4,
+                 delay: int = 2,
+                 min_size: int = None,
+                 max_release: int = None):
+        if not 0 < shrink_to < shrink_above < 1:
+            raise ValueError('Expected 0 < shrink_to < shrink_above < 1')
+
+        self.shrink_above = shrink_above
+        self.shrink_to = shrink_to
+        self.delay = delay
+        self.min_size = min_size
+        self.max_release = max_release
+
+        # number of collections in a row that left too many free cells
+        self.num_above = 0
+
+    def release_size(self, heap, num_garbage: int) -> int:
+        """
+        Returns the number of free cells the heap should release, out of the
+        `num_garbage` cells that were just collected.
+        """
+        # a pacer may have moved the scan threshold above the low-water mark
+        if self.shrink_to <= heap.scan_threshold:
+            return 0
+
+        if heap.num_free / heap.num_total <= self.shrink_above:
+            self.num_above = 0
+            return 0
+
+        self.num_above += 1
+
+        if self.num_above < self.delay:
+            return 0
+
+        self.num_above = 0
+
+        # solve (num_free - size) / (num_total - size) = shrink_to
+        size = int((heap.num_free - self.shrink_to * heap.num_total) / (1 - self.shrink_to))
+
+        min_size = self.min_size if self.min_size is not None else heap.initial_size
+
+        # never release live cells, the cell `free` points to or the one after it
+        size = min(size, num_garbage, heap.num_free - 2, heap.num_total - min_size)
+
+        if self.max_release is not None:
+            size = min(size, self.max_release)
+
+        return max(size, 0)
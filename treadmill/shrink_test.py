@@ -0,0 +1,83 @@
+import pytest
+
+from treadmill.heap import Heap
+from treadmill.shrink import ShrinkPolicy
+
+
+def dummy_get_children(obj):
+    return ()
+
+
+class FakeHeap:
+    def __init__(self, num_free, num_total, initial_size=10):
+        self.num_free = num_free
+        self.num_total = num_total
+        self.initial_size = initial_size
+        self.scan_threshold = 0.2
+
+
+def test_invalid_ratios():
+    with pytest.raises(ValueError):
+        ShrinkPolicy(shrink_above=0.4, shrink_to=0.6)
+
+
+def test_release_size_waits_for_delay():
+    policy = ShrinkPolicy(shrink_above=0.6, shrink_to=0.4, delay=2)
+
+    assert policy.release_size(FakeHeap(80, 100), 80) == 0
+    assert policy.release_size(FakeHeap(80, 100), 80) == 66
+
+
+def test_release_size_resets_when_below_threshold():
+    policy = ShrinkPolicy(shrink_above=0.6, shrink_to=0.4, delay=2)
+
+    policy.release_size(FakeHeap(80, 100), 80)
+    policy.release_size(FakeHeap(50, 100), 30)
+
+    assert policy.release_size(FakeHeap(80, 100), 80) == 0
+
+
+def test_release_size_limits():
+    policy = ShrinkPolicy(shrink_above=0.6, shrink_to=0.4, delay=1, max_release=50)
+    assert policy.release_size(FakeHeap(80, 100), 80) == 50
+
+    policy = ShrinkPolicy(shrink_above=0.6, shrink_to=0.4, delay=1)
+    assert policy.release_size(FakeHeap(80, 100), 20) == 20
+
+    policy = ShrinkPolicy(shrink_above=0.6, shrink_to=0.4, delay=1, min_size=90)
+    assert policy.release_size(FakeHeap(80, 100), 80) == 10
+
+
+def test_shrink_to_must_be_above_scan_threshold():
+    with pytest.raises(ValueError):
+        Heap(get_roots=lambda: (),
+             get_children=dummy_get_children,
+             scan_threshold=0.5,
+             shrink_policy=ShrinkPolicy(shrink_above=0.6, shrink_to=0.4))
+
+
+def test_heap_shrinks_after_spike():
+    live = []
+
+    heap = Heap(get_roots=lambda: live,
+                get_children=dummy_get_children,
+                initial_size=10,
+                shrink_policy=ShrinkPolicy(delay=1))
+
+    # spike, keep 500 cells live
+    for _ in range(500):
+        live.append(heap.allocate())
+
+    peak = heap.num_total
+
+    # drop to 10 live cells
+    del live[10:]
+
+    for _ in range(500):
+        live.append(heap.allocate())
+        live.pop(0)
+
+    assert heap.num_total < peak / 4
+    assert heap.stats.released_cells > 0
+    assert heap.stats.released_bytes == heap.stats.released_cells * heap.bytes_per_cell()
+    assert len(list(heap.free)) == heap.num_total
@@ -0,0 +1,201 @@
+"""
+Saves the allocated cells of a heap to a binary snapshot, and restores a heap
+from it in one pass, so that a program can load a prepared object graph
+instead of building it again.
+
+The snapshot is a pickle stream. For a Heap, the cells are saved in list
+order and the references to them in the values are saved as their indices.
+For an ArenaHeap, whose cells are integer handles, the arena arrays are saved
+as they are, so the handles stay valid.
+"""
+import mmap
+import pickle
+from array import array
+
+from treadmill.arena import Arena, ArenaHeap
+from treadmill.cell import Cell
+from treadmill.heap import Heap
+
+VERSION = 1
+
+
+class CellPickler(pickle.Pickler):
+    """
+    Pickles cells as their index in the snapshot.
+    """
+
+    def __init__(self, file, indices):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.indices = indices
+
+    def persistent_id(self, obj):
+        if type(obj) is not Cell:
+            return None
+
+        try:
+            return self.indices[obj]
+        except KeyError:
+            raise ValueError('A value refers to a free cell') from None
+
+
+class CellUnpickler(pickle.Unpickler):
+    """
+    Unpickles cell indices as the cells of the restored heap.
+    """
+
+    cells = ()
+
+    def persistent_load(self, index):
+        return self.cells[index]
+
+
+def save(heap, file, extra=None):
+    """
+    Writes the allocated cells of the heap and their values to the binary
+    file. extra is saved with them and can refer to cells, e.g. it can be the
+    roots of the program. If the heap is scanning, the white cells are saved
+    as well, and the restored heap starts with all cells allocated.
+    """
+    if isinstance(heap, ArenaHeap):
+        save_arena(heap, file, extra)
+    else:
+        save_cells(heap, file, extra)
+
+
+def save_cells(heap, file, extra):
+    cells = []
+
+    if heap.bottom is not None:
+        cell = heap.bottom
+
+        while cell is not heap.free:
+            cells.append(cell)
+            cell = cell.next
+
+    indices = {cell: index for index, cell in enumerate(cells)}
+    pickler = CellPickler(file, indices)
+
+    pickler.dump({
+        'version': VERSION,
+        'kind': 'cells',
+        'num_total': heap.num_total,
+        'num_cells': len(cells),
+    })
+
+    pickler.dump({
+        'values': [cell.value for cell in cells],
+        'tags': {index: cell.tag for index, cell in enumerate(cells) if cell.tag is not None},
+        'extra': extra,
+    })
+
+
+def save_arena(heap, file, extra):
+    arena = heap.arena
+    pickler = pickle.Pickler(file, pickle.HIGHEST_PROTOCOL)
+
+    pickler.dump({
+        'version': VERSION,
+        'kind': 'arena',
+        'num_total': heap.num_total,
+        'num_free': heap.num_free,
+        'free': heap.free,
+        'bottom': heap.bottom,
+        'live_mark': heap.live_mark,
+        'segment_size': arena.segment_size,
+        'released': arena.released,
+        'released_counts': arena.released_counts,
+    })
+
+    pickler.dump({
+        'previous': arena.previous.tobytes(),
+        'next': arena.next.tobytes(),
+        'marks': bytes(arena.marks),
+        'values': arena.values,
+        'tags': arena.tags,
+        'extra': extra,
+    })
+
+
+def load(file, get_roots, get_children, heap_class=None, **kwargs):
+    """
+    Restores a heap from a snapshot read from the binary file. The remaining
+    arguments are passed to the heap class, which defaults to the class of
+    the saved heap, Heap or ArenaHeap. Returns the heap and the saved extra
+    value.
+    """
+    unpickler = CellUnpickler(file)
+    header = unpickler.load()
+
+    if header.get('version') != VERSION:
+        raise ValueError('Unsupported snapshot version: {}'.format(header.get('version')))
+
+    if header['kind'] == 'arena':
+        return load_arena(unpickler, header, get_roots, get_children, heap_class or ArenaHeap, **kwargs)
+    else:
+        return load_cells(unpickler, header, get_roots, get_children, heap_class or Heap, **kwargs)
+
+
+def load_file(path, get_roots, get_children, heap_class=None, **kwargs):
+    """
+    Restores a heap from the snapshot in the file at path, which is memory
+    mapped instead of read.
+    """
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return load(data, get_roots, get_children, heap_class, **kwargs)
+
+
+def load_cells(unpickler, header, get_roots, get_children, heap_class, **kwargs):
+    heap = heap_class(get_roots, get_children, initial_size=header['num_total'], **kwargs)
+
+    # the heap has no allocated cells yet, so this neither scans nor expands
+    cells = heap.allocate_many(header['num_cells'])
+
+    unpickler.cells = cells
+    data = unpickler.load()
+    tags = data['tags']
+
+    for index, (cell, value) in enumerate(zip(cells, data['values'])):
+        cell.value = value
+
+        if index in tags:
+            cell.tag = tags[index]
+
+    return heap, data['extra']
+
+
+def load_arena(unpickler, header, get_roots, get_children, heap_class, **kwargs):
+    data = unpickler.load()
+
+    arena = Arena(header['segment_size'])
+    arena.previous = array(arena.previous.typecode)
+    arena.previous.frombytes(data['previous'])
+    arena.next = array(arena.next.typecode)
+    arena.next.frombytes(data['next'])
+    arena.marks = bytearray(data['marks'])
+    arena.values = data['values']
+    arena.tags = data['tags']
+    arena.released = header['released']
+    arena.released_counts = header['released_counts']
+
+    heap = heap_class(get_roots, get_children, initial_size=1, segment_size=header['segment_size'], **kwargs)
+
+    # replace the cell the heap was created with by the saved arena
+    heap.arena = arena
+    heap.free = header['free']
+    heap.bottom = header['bottom']
+    heap.live_mark = header['live_mark']
+    heap.num_total = header['num_total']
+    heap.num_free = header['num_free']
+    # the saved cells count as allocated since the last flip, and are
+    # marked like allocated cells, which the white ones were not
+    heap.num_allocated = header['num_total'] - header['num_free']
+
+    if heap.bottom is not None:
+        cell = heap.bottom
+
+        while cell != heap.free:
+            arena.marks[cell] = heap.live_mark
+            cell = arena.next[cell]
+
+    return heap, data['extra']
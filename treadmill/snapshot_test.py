@@ -0,0 +1,117 @@
+import io
+
+import pytest
+
+from treadmill import snapshot
+from treadmill.arena import ArenaHeap
+from treadmill.heap import Heap
+
+
+def build(heap_class):
+    """
+    Returns a heap holding a list of 50 cells, each pointing to the previous
+    one, with every other cell holding an unboxed scalar, and the roots.
+    """
+    roots = []
+
+    def get_children(cell):
+        value = heap.read(cell)
+        return (value[0],) if isinstance(value, tuple) else ()
+
+    heap = heap_class(lambda: roots, get_children, initial_size=10)
+    previous = heap.allocate()
+    heap.write(previous, 'first')
+    roots.append(previous)
+
+    for i in range(49):
+        cell = heap.allocate()
+
+        if i % 2:
+            heap.write_scalar(cell, str, i)
+        else:
+            heap.write(cell, (previous, i))
+
+        previous = cell
+        roots.append(cell)
+
+    return heap, roots
+
+
+def count_cells(heap):
+    cell = heap.cell_after(heap.free)
+    num_cells = 1
+
+    while cell != heap.free:
+        cell = heap.cell_after(cell)
+        num_cells += 1
+
+    return num_cells
+
+
+@pytest.mark.parametrize('heap_class', [Heap, ArenaHeap])
+def test_save_and_load(heap_class):
+    heap, roots = build(heap_class)
+    values = [heap.read(cell) for cell in roots]
+
+    file = io.BytesIO()
+    snapshot.save(heap, file, extra=roots)
+    file.seek(0)
+
+    restored_roots = []
+    restored, saved_roots = snapshot.load(file, lambda: restored_roots, lambda cell: ())
+    restored_roots.extend(saved_roots)
+
+    assert type(restored) is heap_class
+    assert restored.num_total == heap.num_total
+    assert restored.num_free == heap.num_free
+    assert count_cells(restored) == restored.num_total
+
+    restored_values = [restored.read(cell) for cell in saved_roots]
+
+    # the references to cells point to the restored cells
+    for value, restored_value in zip(values[1:], restored_values[1:]):
+        if isinstance(value, tuple):
+            assert restored_value[0] is saved_roots[roots.index(value[0])]
+            assert restored_value[1] == value[1]
+        else:
+            assert restored_value == value
+
+    # the restored heap keeps working
+    for _ in range(100):
+        assert restored.allocate() not in saved_roots
+
+
+def test_load_file_is_memory_mapped(tmpdir):
+    heap, roots = build(Heap)
+    path = str(tmpdir.join('heap.snapshot'))
+
+    with open(path, 'wb') as file:
+        snapshot.save(heap, file, extra=roots)
+
+    restored, saved_roots = snapshot.load_file(path, lambda: saved_roots, lambda cell: ())
+
+    assert restored.read(saved_roots[0]) == 'first'
+
+
+@pytest.mark.parametrize('heap_class', [Heap, ArenaHeap])
+def test_save_while_scanning(heap_class):
+    heap, roots = build(heap_class)
+
+    if not heap.is_scanning():
+        heap.start_scanning()
+
+    file = io.BytesIO()
+    snapshot.save(heap, file, extra=roots)
+    file.seek(0)
+
+    def get_children(cell):
+        value = restored.read(cell)
+        return (value[0],) if isinstance(value, tuple) else ()
+
+    restored, saved_roots = snapshot.load(file, lambda: saved_roots, get_children)
+
+    assert not restored.is_scanning()
+
+    # the cells that were white when saving are kept as well
+    for _ in range(200):
+        assert restored.allocate() not in saved_roots
@@ -0,0 +1,252 @@
+import heapq
+import time
+
+# sub-bucket bits of the pause histograms, which are accurate to about 6%
+PAUSE_PRECISION = 4
+
+# the parts of an allocation that are timed separately
+PHASES = ('scan', 'expand', 'flip')
+
+
+class Histogram:
+    """
+    Counts values in buckets whose upper bounds grow exponentially, like an
+    HDR histogram. Each power of two range is divided into 2 ** precision
+    equal buckets, so a value is off by at most 1 / 2 ** precision of itself,
+    and values below 2 ** (precision + 1) are counted exactly. With the
+    default precision of 0 the upper bounds are powers of two. Recording a
+    value is a few integer operations.
+    """
+
+    def __init__(self, precision: int = 0):
+        self.precision = precision
+        self.buckets = [0] * ((65 - precision) << precision)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value: int):
+        precision = self.precision
+        shift = value.bit_length() - precision - 1
+
+        if shift <= 0:
+            bucket = value
+        else:
+            bucket = min((shift << precision) + (value >> shift), len(self.buckets) - 1)
+
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.sum += value
+
+        if value > self.max:
+            self.max = value
+
+    def upper_bound(self, bucket: int):
+        """
+        Returns the largest value counted in the bucket.
+        """
+        shift = (bucket >> self.precision) - 1
+
+        if shift <= 0:
+            return bucket
+
+        top = bucket - (shift << self.precision)
+        return ((top + 1) << shift) - 1
+
+    def percentile(self, p: float):
+        """
+        Returns an upper bound of the p-th percentile, where 0 <= p <= 100,
+        which is the upper bound of its bucket, or the maximum if lower.
+        """
+        if self.count == 0:
+            return 0
+
+        rank = max(1, int(self.count * p / 100 + 0.5))
+        seen = 0
+
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+
+            if seen >= rank:
+                return min(self.upper_bound(bucket), self.max)
+
+        return self.max
+
+    def snapshot(self):
+        """
+        Returns the histogram as a dictionary. Buckets are keyed by their
+        inclusive upper bound, empty buckets are left out.
+        """
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'buckets': {self.upper_bound(bucket): count
+                        for bucket, count in enumerate(self.buckets) if count},
+        }
+
+
+class HeapStats:
+    """
+    Counters describing what a heap has done. The counters are updated
+    outside of the allocation fast path, so they are always on. Allocation
+    pause times are only recorded with `record_pauses`, together with the
+    time spent in each phase of the allocations, and the `num_worst_pauses`
+    longest pauses with the state of the heap when they ended.
+    """
+
+    def __init__(self, record_pauses: bool = False, num_worst_pauses: int = 10):
+        self.record_pauses = record_pauses
+        self.num_worst_pauses = num_worst_pauses
+
+        # allocations before the current cycle, the heap counts the rest
+        self.allocations = 0
+        self.cycles_started = 0
+        self.cycles_completed = 0
+        # cells scanned by cycles before the current one
+        self.scanned_cells = 0
+        # cycles that found no garbage and restarted scanning
+        self.empty_cycles = 0
+        self.reclaimed_cells = 0
+        self.reclaimed_per_cycle = Histogram()
+        self.expansions = 0
+        self.expanded_cells = 0
+        self.expansion_sizes = Histogram()
+        self.released_cells = 0
+        self.released_bytes = 0
+        # reads that had to mark a white cell to be scanned
+        self.read_barrier_hits = 0
+        # writes while scanning, which marked the overwritten children
+        self.write_barrier_hits = 0
+        # allocation pauses in nanoseconds, in total and by phase
+        self.pauses = Histogram(PAUSE_PRECISION)
+        self.phase_pauses = {phase: Histogram(PAUSE_PRECISION) for phase in PHASES}
+        # a min-heap of (pause, sequence number, details) tuples
+        self.worst_pauses = []
+
+    def record_collection(self, num_reclaimed: int):
+        self.cycles_completed += 1
+        self.reclaimed_cells += num_reclaimed
+        self.reclaimed_per_cycle.record(num_reclaimed)
+
+    def record_expansion(self, size: int):
+        self.expansions += 1
+        self.expanded_cells += size
+        self.expansion_sizes.record(size)
+
+    def record_release(self, size: int, num_bytes: int):
+        self.released_cells += size
+        self.released_bytes += num_bytes
+
+    def snapshot(self):
+        """
+        Returns all counters as a dictionary.
+        """
+        return {
+            'allocations': self.allocations,
+            'cycles_started': self.cycles_started,
+            'cycles_completed': self.cycles_completed,
+            'scanned_cells': self.scanned_cells,
+            'empty_cycles': self.empty_cycles,
+            'reclaimed_cells': self.reclaimed_cells,
+            'reclaimed_per_cycle': self.reclaimed_per_cycle.snapshot(),
+            'expansions': self.expansions,
+            'expanded_cells': self.expanded_cells,
+            'expansion_sizes': self.expansion_sizes.snapshot(),
+            'released_cells': self.released_cells,
+            'released_bytes': self.released_bytes,
+            'read_barrier_hits': self.read_barrier_hits,
+            'write_barrier_hits': self.write_barrier_hits,
+            'pauses': self.pauses.snapshot(),
+            'phase_pauses': {phase: histogram.snapshot()
+                             for phase, histogram in self.phase_pauses.items()},
+            'worst_pauses': [details for _, _, details in sorted(self.worst_pauses, reverse=True)],
+        }
+
+    def record_pause(self, pause: int, phases: dict, heap):
+        """
+        Records an allocation pause and the time spent in each phase, in
+        nanoseconds. Keeps the details of the pause if it is one of the
+        longest.
+        """
+        self.pauses.record(pause)
+
+        for phase, time in phases.items():
+            if time:
+                self.phase_pauses[phase].record(time)
+
+        worst = self.worst_pauses
+
+        if len(worst) < self.num_worst_pauses or pause > worst[0][0]:
+            details = {
+                'pause': pause,
+                'phases': dict(phases),
+                'allocations': self.allocations + heap.num_allocated,
+                'num_total': heap.num_total,
+                'num_free': heap.num_free,
+                'num_scanned': heap.num_scanned,
+                'scanning': heap.is_scanning(),
+            }
+
+            entry = (pause, self.pauses.count, details)
+
+            if len(worst) < self.num_worst_pauses:
+                heapq.heappush(worst, entry)
+            else:
+                heapq.heapreplace(worst, entry)
+
+
+def record_pauses(heap, stats: HeapStats):
+    """
+    Replaces the allocation methods of the heap instance with versions that
+    record how long each call takes, in nanoseconds. The scan work, the
+    expansions and the flips done by a call are timed as well, each without
+    the time of the others nested in it.
+    """
+    allocate = heap.allocate
+    allocate_many = heap.allocate_many
+    clock = time.perf_counter
+
+    # the time spent in each phase by the current call, and the time spent
+    # in the phases nested in the innermost running phase
+    phases = dict.fromkeys(PHASES, 0)
+    nested = [0]
+
+    def timed_phase(phase, method):
+        def timed(*args):
+            outer = nested[0]
+            nested[0] = 0
+            start = clock()
+
+            try:
+                return method(*args)
+            finally:
+                elapsed = int((clock() - start) * 1e9)
+                phases[phase] += elapsed - nested[0]
+                nested[0] = outer + elapsed
+
+        return timed
+
+    def timed_allocate():
+        for phase in PHASES:
+            phases[phase] = 0
+
+        start = clock()
+        cell = allocate()
+        stats.record_pause(int((clock() - start) * 1e9), phases, heap)
+        return cell
+
+    def timed_allocate_many(n):
+        for phase in PHASES:
+            phases[phase] = 0
+
+        start = clock()
+        cells = allocate_many(n)
+        stats.record_pause(int((clock() - start) * 1e9), phases, heap)
+        return cells
+
+    heap.scan_allocation = timed_phase('scan', heap.scan_allocation)
+    heap.expand = timed_phase('expand', heap.expand)
+    heap.start_scanning = timed_phase('flip', heap.start_scanning)
+    heap.allocate = timed_allocate
+    heap.allocate_many = timed_allocate_many
@@ -0,0 +1,133 @@
+from treadmill.heap import Heap
+from treadmill.stats import Histogram, HeapStats
+
+
+def dummy_get_children(obj):
+    return ()
+
+
+def test_histogram_buckets():
+    histogram = Histogram()
+
+    for value in (0, 1, 5, 7, 8):
+        histogram.record(value)
+
+    snapshot = histogram.snapshot()
+
+    assert snapshot['count'] == 5
+    assert snapshot['sum'] == 21
+    assert snapshot['max'] == 8
+    assert snapshot['buckets'] == {0: 1, 1: 1, 7: 2, 15: 1}
+
+
+def test_histogram_percentile():
+    histogram = Histogram()
+
+    for value in range(1, 101):
+        histogram.record(value)
+
+    assert histogram.percentile(50) == 63
+    assert histogram.percentile(99) == 100
+    assert Histogram().percentile(50) == 0
+
+
+def test_metrics_count_cycles():
+    live = []
+
+    heap = Heap(get_roots=lambda: live,
+                get_children=dummy_get_children,
+                initial_size=10,
+                expand_size=10)
+
+    live.append(heap.allocate())
+
+    for _ in range(50):
+        heap.allocate()
+
+    metrics = heap.metrics()
+
+    assert metrics['allocations'] == 51
+    assert metrics['cycles_started'] >= metrics['cycles_completed'] > 0
+    assert metrics['reclaimed_cells'] == metrics['reclaimed_per_cycle']['sum']
+    assert metrics['num_total'] == heap.num_total
+    assert metrics['expanded_cells'] == heap.num_total - 10
+    assert metrics['scanned_cells'] >= metrics['cycles_completed']
+
+
+def test_metrics_count_empty_cycles():
+    live = []
+
+    heap = Heap(get_roots=lambda: live,
+                get_children=dummy_get_children,
+                initial_size=10)
+
+    for _ in range(20):
+        live.append(heap.allocate())
+
+    assert heap.metrics()['empty_cycles'] > 0
+    assert heap.metrics()['reclaimed_cells'] == 0
+
+
+def test_read_barrier_hits():
+    live = []
+
+    heap = Heap(get_roots=lambda: live,
+                get_children=dummy_get_children,
+                initial_size=10)
+
+    live.append(heap.allocate())
+    cell = heap.allocate()
+    heap.start_scanning()
+
+    heap.read(cell)
+    heap.read(cell)
+
+    # the second read finds the cell already marked
+    assert heap.stats.read_barrier_hits == 1
+
+
+def test_record_pauses():
+    heap = Heap(get_roots=lambda: (),
+                get_children=dummy_get_children,
+                stats=HeapStats(record_pauses=True))
+
+    heap.allocate()
+    heap.allocate_many(3)
+
+    assert heap.metrics()['pauses']['count'] == 2
+
+
+def test_histogram_precision():
+    histogram = Histogram(precision=2)
+
+    for value in (5, 7, 100, 1000):
+        histogram.record(value)
+
+    # values below 8 are exact, larger ones are within a quarter of the bound
+    assert sorted(histogram.snapshot()['buckets']) == [5, 7, 111, 1023]
+
+
+def test_record_pauses_by_phase():
+    live = []
+
+    heap = Heap(get_roots=lambda: live,
+                get_children=dummy_get_children,
+                initial_size=10,
+                stats=HeapStats(record_pauses=True, num_worst_pauses=3))
+
+    for _ in range(100):
+        live.append(heap.allocate())
+
+    metrics = heap.metrics()
+    phases = metrics['phase_pauses']
+
+    assert phases['flip']['count'] == metrics['cycles_started']
+    assert phases['expand']['count'] == metrics['expansions']
+    assert phases['scan']['count'] > 0
+
+    worst = metrics['worst_pauses']
+
+    assert len(worst) == 3
+    assert worst[0]['pause'] == metrics['pauses']['max']
+    assert worst[0]['pause'] >= worst[1]['pause'] >= worst[2]['pause']
+    assert sum(worst[0]['phases'].values()) <= worst[0]['pause']
@@ -0,0 +1,126 @@
+import logging
+from collections import deque, namedtuple
+
+TraceEvent = namedtuple('TraceEvent', ['kind', 'cell', 'num_free', 'num_total'])
+
+
+class Tracer:
+    """
+    Receives trace events from a heap. Subclasses decide where the events go.
+    """
+
+    def event(self, kind, heap, cell=None):
+        """
+        Called for every event, where kind is one of allocate, read, write,
+        grey, scan, flip, collect, expand and shrink.
+        """
+        raise NotImplementedError
+
+
+class RingBufferTracer(Tracer):
+    """
+    Keeps the last `capacity` events in memory.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.buffer = deque(maxlen=capacity)
+
+    def event(self, kind, heap, cell=None):
+        self.buffer.append(TraceEvent(kind, cell, heap.num_free, heap.num_total))
+
+    def events(self):
+        """
+        Returns the recorded events, oldest first.
+        """
+        return list(self.buffer)
+
+    def clear(self):
+        self.buffer.clear()
+
+
+class LoggingTracer(Tracer):
+    """
+    Writes every event to a logger at the debug level.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def event(self, kind, heap, cell=None):
+        if cell is None:
+            self.logger.debug('%s (%s)', kind, heap.string())
+        else:
+            self.logger.debug('%s %s (%s)', kind, cell, heap.string())
+
+
+def instrument(heap, tracer: Tracer):
+    """
+    Replaces the methods of the heap instance with versions that report events
+    to the tracer. Heaps without a tracer are never instrumented and pay
+    nothing for tracing.
+    """
+    allocate = heap.allocate
+    allocate_many = heap.allocate_many
+    read = heap.read
+    write = heap.write
+    mark_to_scan = heap.mark_to_scan
+    advance_scan = heap.advance_scan
+    start_scanning = heap.start_scanning
+    collect = heap.collect
+    expand = heap.expand
+    release = heap.release
+
+    def traced_allocate():
+        cell = allocate()
+        tracer.event('allocate', heap, cell)
+        return cell
+
+    def traced_allocate_many(n):
+        cells = allocate_many(n)
+        for cell in cells:
+            tracer.event('allocate', heap, cell)
+        return cells
+
+    def traced_read(cell):
+        tracer.event('read', heap, cell)
+        return read(cell)
+
+    def traced_write(cell, value):
+        tracer.event('write', heap, cell)
+        write(cell, value)
+
+    def traced_mark_to_scan(cell):
+        if not heap.is_marked(cell):
+            tracer.event('grey', heap, cell)
+        mark_to_scan(cell)
+
+    def traced_advance_scan():
+        tracer.event('scan', heap, heap.scan)
+        return advance_scan()
+
+    def traced_start_scanning():
+        tracer.event('flip', heap)
+        start_scanning()
+
+    def traced_collect():
+        tracer.event('collect', heap)
+        collect()
+
+    def traced_expand(size=None):
+        tracer.event('expand', heap)
+        expand(size)
+
+    def traced_release(first, size):
+        tracer.event('shrink', heap, first)
+        return release(first, size)
+
+    heap.allocate = traced_allocate
+    heap.allocate_many = traced_allocate_many
+    heap.read = traced_read
+    heap.write = traced_write
+    heap.mark_to_scan = traced_mark_to_scan
+    heap.advance_scan = traced_advance_scan
+    heap.start_scanning = traced_start_scanning
+    heap.collect = traced_collect
+    heap.expand = traced_expand
+    heap.release = traced_release
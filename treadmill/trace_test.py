@@ -0,0 +1,86 @@
+import logging
+
+from treadmill.heap import Heap
+from treadmill.trace import RingBufferTracer, LoggingTracer
+
+
+def dummy_get_roots():
+    return ()
+
+
+def dummy_get_children(obj):
+    return ()
+
+
+def test_heap_without_tracer_is_not_instrumented():
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children)
+
+    assert heap.tracer is None
+    assert 'allocate' not in vars(heap)
+    assert 'mark_to_scan' not in vars(heap)
+
+
+def test_ring_buffer_records_events():
+    tracer = RingBufferTracer()
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=1,
+                expand_size=10,
+                tracer=tracer)
+
+    cell = heap.allocate()
+    heap.write(cell, 123)
+
+    events = tracer.events()
+
+    assert [event.kind for event in events] == ['expand', 'allocate', 'write']
+    assert events[1].cell == cell
+    assert events[1].num_total == 11
+
+
+def test_ring_buffer_keeps_last_events():
+    tracer = RingBufferTracer(capacity=3)
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                initial_size=10,
+                scan_threshold=0,
+                tracer=tracer)
+
+    cells = [heap.allocate() for _ in range(5)]
+
+    assert [event.cell for event in tracer.events()] == cells[2:]
+
+
+def test_scanning_events():
+    cells = []
+
+    def get_roots():
+        return cells[0:2]
+
+    tracer = RingBufferTracer()
+    heap = Heap(get_roots=get_roots,
+                get_children=dummy_get_children,
+                initial_size=10,
+                scan_threshold=0.5,
+                scan_step_size=1,
+                tracer=tracer)
+
+    for _ in range(6):
+        cells.append(heap.allocate())
+
+    kinds = [event.kind for event in tracer.events()]
+
+    assert kinds[:9] == ['allocate'] * 5 + ['flip', 'grey', 'grey', 'scan']
+
+
+def test_logging_tracer(caplog):
+    logger = logging.getLogger('episcopal')
+    heap = Heap(get_roots=dummy_get_roots,
+                get_children=dummy_get_children,
+                tracer=LoggingTracer(logger))
+
+    with caplog.at_level(logging.DEBUG, logger='episcopal'):
+        heap.allocate()
+
+    assert caplog.records[0].getMessage().startswith('allocate')
@@ -0,0 +1,25 @@
+class WeakCell:
+    """
+    A reference to a cell that does not keep it live. Once the heap finds the
+    cell dead, the reference is cleared and get returns None. Weak cells are
+    created by Heap.weak.
+    """
+
+    __slots__ = ('heap', 'cell', '__weakref__')
+
+    def __init__(self, heap, cell):
+        self.heap = heap
+        self.cell = cell
+
+    def get(self):
+        """
+        Returns the cell, or None if it is dead. While scanning, the cell is
+        marked to be scanned, because the mutator may store it in a cell that
+        was already scanned.
+        """
+        cell = self.cell
+
+        if cell is not None and self.heap.is_scanning():
+            self.heap.mark_to_scan(cell)
+
+        return cell